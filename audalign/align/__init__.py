@@ -1,4 +1,3 @@
-import multiprocessing
 import os
 import typing
 from functools import partial
@@ -6,6 +5,7 @@ from posixpath import basename
 
 import audalign
 import audalign.filehandler as filehandler
+import audalign.pool
 import tqdm
 from audalign.recognizers import BaseRecognizer
 
@@ -133,10 +133,11 @@ def calc_alignments(
             if os.path.basename(file_path) in file_names_to_align:
                 temp_file_list += [file_path]
 
-        with multiprocessing.Pool(recognizer.config.num_processors) as pool:
+        if audalign.pool.can_use_pool():
+            pool = audalign.pool.get_pool(recognizer.config.num_processors)
             results_list = pool.map(_calc_alignments, tqdm.tqdm(list(temp_file_list)))
-            pool.close()
-            pool.join()
+        else:
+            results_list = [_calc_alignments(x) for x in tqdm.tqdm(temp_file_list)]
 
         for i in results_list:
             if i is not None:
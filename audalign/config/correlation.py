@@ -37,6 +37,39 @@ class CorrelationConfig(BaseConfig):
     # matching, but potentially more fingerprints.
     DEFAULT_OVERLAP_RATIO = 0.5
 
+    ######################################################################
+    # If set, correcognize_directory transforms the target once and
+    # reuses it for every against file if its FFTs take at most this many
+    # bytes, and locality correlation keeps up to this many bytes of
+    # target window FFTs. 0 or None keeps nothing beyond one window FFT.
+    # Setting it faster recognizes directories, at the cost of memory
+    target_spectrum_max_size = 0
+
+    ######################################################################
+    # With max_lags and without locality, only correlates lags within
+    # max_lags, which is much faster for long files, and makes confidences
+    # relative to the highest correlation within max_lags. Otherwise every
+    # lag is correlated and confidences are relative to the highest
+    # correlation at any lag, so a stronger match outside max_lags lowers
+    # the confidences of matches within it
+    normalize_within_max_lags = False
+
+    ######################################################################
+    # Filters and correlates files as float32 instead of float64, halving
+    # the memory of correlating long files. Confidences and scaling
+    # factors are then only accurate to about 6 digits
+    float32 = False
+
+    ######################################################################
+    # Coarse to fine correlation, used without locality if coarse_factor is
+    # set. Files are correlated at sample_rate / coarse_factor, then lags
+    # within coarse_radius seconds of the coarse_candidates highest coarse
+    # peaks are correlated at sample_rate. Faster for long files, but
+    # matches further than coarse_radius from every candidate are missed.
+    coarse_factor: typing.Optional[int] = None
+    coarse_candidates = 5
+    coarse_radius = 0.1
+
     SCALING_16_BIT = 65536
     LOCALITY_OVERLAP_RATIO = 0.5
     DEFAULT_LOCALITY_FILTER_PROP = 0.6
@@ -20,6 +20,24 @@ class FingerprintConfig(BaseConfig):
 
     'base_three' hash style consists of three peaks. Three frequencies and two time differences.
 
+    hash engine has two options. All fingerprints must also be made with the same hash engine to match.
+
+    'python' hash engine hashes each peak pair or triple with sha1. Fingerprints saved with
+    older versions of audalign use this engine.
+
+    'numpy' hash engine builds all peak pairs and triples at once and bit-packs the hash style
+    components into integers. Much faster for higher accuracies.
+
+    hash format has two options. 'dict' stores each file's fingerprints as a dict of hex hash
+    strings to lists of offsets. 'packed' stores them as sorted numpy arrays of integer hashes
+    and offsets, which takes roughly a tenth of the memory and matches faster. Use 'packed'
+    with the 'numpy' hash engine for the fastest fingerprinting.
+
+    peak detection has two options. 'diamond' finds spectrogram peaks with a diamond shaped
+    neighborhood of peak_neighborhood_size. 'square' uses a square neighborhood with the same
+    half width, which can be filtered one axis at a time. It finds about 90% of the same peaks
+    and is many times faster.
+
     multiprocessing is set to True by default
 
     There are four accuracy levels with 1 being the lowest accuracy but the fastest. 3 is the highest recommended.
@@ -28,6 +46,9 @@ class FingerprintConfig(BaseConfig):
     """
 
     hash_style = "panako_mod"
+    hash_engine = "python"
+    hash_format = "dict"
+    peak_detection = "diamond"
     _accuracy = 2
     filter_matches = 1
     locality: typing.Optional[float] = None
@@ -83,6 +104,37 @@ class FingerprintConfig(BaseConfig):
     # affect performance.
     peak_sort = True
 
+    ######################################################################
+    # Files longer than streaming_min_duration seconds are fingerprinted in
+    # blocks of streaming_block_size seconds, which bounds the memory used
+    # for the spectrogram. Gives the same fingerprints as fingerprinting the
+    # whole file when peak_sort is True. None never fingerprints in blocks.
+    streaming_min_duration: typing.Optional[float] = 600
+    streaming_block_size = 60
+
+    ######################################################################
+    # Max number of files sent to worker processes and not yet added to the
+    # fingerprinted files when fingerprinting a directory with
+    # multiprocessing. Files are added as they finish. None is twice the
+    # number of processes.
+    max_in_flight: typing.Optional[int] = None
+
+    ######################################################################
+    # Directory of an on disk cache of fingerprints, keyed by file path, size,
+    # modification time and the settings above. Files found in the cache
+    # aren't decoded or fingerprinted again. None disables the cache. Least
+    # recently used fingerprints are removed once the cache is larger than
+    # cache_max_size bytes.
+    cache_dir: typing.Optional[str] = None
+    cache_max_size = 2**30
+
+    ######################################################################
+    # Number of worker processes fingerprinted files are partitioned across
+    # for recognition. Each worker keeps its shard in memory, and finds
+    # matches and counts offsets for its own files. None or 1 recognizes in
+    # the calling process.
+    recognition_shards: typing.Optional[int] = None
+
     ######################################################################
     # Number of bits to grab from the front of the SHA1 hash in the
     # fingerprint calculation. The more you grab, the more memory storage,
@@ -138,6 +190,86 @@ class FingerprintConfig(BaseConfig):
         """Gets the hash style. Is one of ["base", "panako", "panako_mod", "base_three"]"""
         return self.hash_style
 
+    def set_hash_engine(self, hash_engine: str) -> None:
+        """Sets the hash engine. Must be one of ["python", "numpy"]
+
+        Args
+        ----
+            hash_engine (str): Engine to use for generating hashes
+        """
+        if hash_engine not in ["python", "numpy"]:
+            raise ValueError(
+                f'Hash engine "{hash_engine}" must be one of ["python", "numpy"]'
+            )
+        self.hash_engine = hash_engine
+
+    def get_hash_engine(self) -> str:
+        """Gets the hash engine. Is one of ["python", "numpy"]"""
+        return self.hash_engine
+
+    def set_hash_format(self, hash_format: str) -> None:
+        """Sets the hash format. Must be one of ["dict", "packed"]
+
+        Args
+        ----
+            hash_format (str): How fingerprints are stored
+        """
+        if hash_format not in ["dict", "packed"]:
+            raise ValueError(
+                f'Hash format "{hash_format}" must be one of ["dict", "packed"]'
+            )
+        self.hash_format = hash_format
+
+    def get_hash_format(self) -> str:
+        """Gets the hash format. Is one of ["dict", "packed"]"""
+        return self.hash_format
+
+    def set_peak_detection(self, peak_detection: str) -> None:
+        """Sets the peak detection. Must be one of ["diamond", "square"]
+
+        Args
+        ----
+            peak_detection (str): Neighborhood shape used to find spectrogram peaks
+        """
+        if peak_detection not in ["diamond", "square"]:
+            raise ValueError(
+                f'Peak detection "{peak_detection}" must be one of ["diamond", "square"]'
+            )
+        self.peak_detection = peak_detection
+
+    def get_peak_detection(self) -> str:
+        """Gets the peak detection. Is one of ["diamond", "square"]"""
+        return self.peak_detection
+
+    def get_fingerprint_settings(self) -> dict:
+        """Every setting that changes the fingerprints of a file
+
+        Returns:
+            [dict]: setting name to value
+        """
+        return {
+            name: getattr(self, name)
+            for name in [
+                "hash_style",
+                "hash_engine",
+                "hash_format",
+                "peak_detection",
+                "sample_rate",
+                "fft_window_size",
+                "DEFAULT_OVERLAP_RATIO",
+                "default_fan_value",
+                "default_amp_min",
+                "peak_neighborhood_size",
+                "min_hash_time_delta",
+                "max_hash_time_delta",
+                "peak_sort",
+                "FINGERPRINT_REDUCTION",
+                "freq_threshold",
+                "start_end",
+                "normalize",
+            ]
+        }
+
     def set_accuracy(self, accuracy: int) -> None:
         """
         Sets the accuracy level of audalign object
@@ -0,0 +1,199 @@
+"""
+Cache of decoded audio shared by every reader of audio files
+
+filehandler.read decodes files with ffmpeg, then resamples and normalizes them, which
+is the largest fixed cost of recognition. Decoded channels are kept in memory, keyed by
+the file's path, size and modification time and by the read settings, so a file read
+again by fingerprinting, correlation, or fine alignment isn't decoded again. The least
+recently used channels are dropped once they take more than max_size bytes.
+
+The cache is off until it's configured with a max_size. Every process keeps its own
+cache, so with the shared worker pool up to max_size bytes are kept in each worker as
+well as in the process that created the pool.
+
+If cache_dir is set, decoded channels are also written to .npy files there, which are
+memory mapped by later reads in any process, with the least recently used removed once
+they take more than disk_max_size bytes.
+
+Settings are per process, set them with configure before starting pooled work. Worker
+processes of audalign.pool start with the settings of the process that created the pool.
+"""
+
+import collections
+import hashlib
+import os
+import threading
+import typing
+
+import numpy as np
+
+DEFAULT_MAX_SIZE = 0
+DEFAULT_DISK_MAX_SIZE = 2**32
+
+_max_size = DEFAULT_MAX_SIZE
+_cache_dir: typing.Optional[str] = None
+_disk_max_size = DEFAULT_DISK_MAX_SIZE
+_channels = collections.OrderedDict()  # key -> channel, least recently used first
+_size = 0
+_lock = threading.Lock()
+
+
+def configure(
+    max_size: int = DEFAULT_MAX_SIZE,
+    cache_dir: typing.Optional[str] = None,
+    disk_max_size: int = DEFAULT_DISK_MAX_SIZE,
+) -> None:
+    """
+    Sets the cache settings and clears the in memory cache
+
+    The shared worker pool is closed, so its workers are started again with the new
+    settings.
+
+    Args
+    ----
+        max_size (int): max bytes of decoded channels kept in memory by each process, 0
+            disables the in memory cache
+        cache_dir (str, optional): directory of .npy files of decoded channels, not
+            written if None
+        disk_max_size (int): max bytes of .npy files in cache_dir
+    """
+    import audalign.pool
+
+    _set_settings(max_size, cache_dir, disk_max_size)
+    audalign.pool.close_pool()
+
+
+def settings() -> tuple:
+    """(max_size, cache_dir, disk_max_size) of this process, for configuring workers"""
+    return _max_size, _cache_dir, _disk_max_size
+
+
+def _set_settings(
+    max_size: int, cache_dir: typing.Optional[str], disk_max_size: int
+) -> None:
+    global _max_size, _cache_dir, _disk_max_size
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+    _max_size, _cache_dir, _disk_max_size = max_size, cache_dir, disk_max_size
+    clear()
+
+
+def clear() -> None:
+    """Drops every channel kept in memory, .npy files in cache_dir are kept"""
+    global _size
+    with _lock:
+        _channels.clear()
+        _size = 0
+
+
+def cache_key(file_path: str, start_end, sample_rate: int, normalize: bool):
+    """
+    Key of a decoded file, None if the file can't be found
+
+    Includes the file's size and modification time, so modified files miss the cache
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    if start_end is not None:
+        start_end = tuple(start_end)
+    return (
+        os.path.abspath(file_path),
+        stat.st_size,
+        stat.st_mtime_ns,
+        start_end,
+        sample_rate,
+        bool(normalize),
+    )
+
+
+def get(key) -> typing.Optional[np.ndarray]:
+    """Returns the read only channel of key, or None if it isn't cached"""
+    if key is None:
+        return None
+    with _lock:
+        channel = _channels.get(key)
+        if channel is not None:
+            _channels.move_to_end(key)
+            return channel
+    if _cache_dir is None:
+        return None
+
+    path = _disk_path(key)
+    try:
+        channel = np.asarray(np.load(path, mmap_mode="r"))
+        os.utime(path)
+    except (OSError, ValueError):
+        return None
+    _keep(key, channel)
+    return channel
+
+
+def put(key, channel: np.ndarray) -> np.ndarray:
+    """
+    Caches channel, evicting least recently used channels if the cache is too large
+
+    Returns
+    -------
+        channel (np.ndarray): read only channel, as returned by later gets
+    """
+    if key is None:
+        return channel
+    channel = np.asarray(channel)
+    channel.flags.writeable = False
+    _keep(key, channel)
+    if _cache_dir is not None:
+        path = _disk_path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npy"
+        try:
+            np.save(temp_path, channel)
+            os.replace(temp_path, path)
+        except OSError:
+            pass
+        else:
+            _evict_disk()
+    return channel
+
+
+def _keep(key, channel: np.ndarray) -> None:
+    global _size
+    if channel.nbytes > _max_size:
+        return
+    with _lock:
+        previous = _channels.pop(key, None)
+        if previous is not None:
+            _size -= previous.nbytes
+        _channels[key] = channel
+        _size += channel.nbytes
+        while _size > _max_size:
+            _, dropped = _channels.popitem(last=False)
+            _size -= dropped.nbytes
+
+
+def _disk_path(key) -> str:
+    return os.path.join(
+        _cache_dir, hashlib.sha1(repr(key).encode("utf-8")).hexdigest() + ".npy"
+    )
+
+
+def _evict_disk() -> None:
+    entries = []
+    for name in os.listdir(_cache_dir):
+        if not name.endswith(".npy") or name.endswith(".tmp.npy"):
+            continue
+        try:
+            stat = os.stat(os.path.join(_cache_dir, name))
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+
+    total_size = sum(x[1] for x in entries)
+    for _, size, name in sorted(entries):
+        if total_size <= _disk_max_size:
+            break
+        try:
+            os.remove(os.path.join(_cache_dir, name))
+        except FileNotFoundError:
+            pass
+        total_size -= size
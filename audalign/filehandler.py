@@ -1,7 +1,7 @@
 import fnmatch
 import math
-import multiprocessing
 import os
+import struct
 import typing
 from functools import partial
 from functools import wraps
@@ -11,6 +11,8 @@ from numpy.core.defchararray import array
 from pydub import AudioSegment, effects
 from pydub.exceptions import CouldntDecodeError
 
+import audalign.decode_cache
+import audalign.pool
 from audalign.config import BaseConfig
 from audalign.config.fingerprint import FingerprintConfig
 
@@ -20,6 +22,12 @@ except ImportError:
     # Optional dependency
     ...
 
+try:
+    import soundfile
+except ImportError:
+    # Optional dependency, reads flac files without ffmpeg
+    soundfile = None
+
 def _import_optional_dependencies(func):
     @wraps(func)
     def wrapper_decorator(*args, **kwargs):
@@ -65,20 +73,24 @@ def create_audiosegment(
         sample_rate = BaseConfig.sample_rate
     if os.path.splitext(filepath)[1] in [".txt", ".json"]:
         raise CouldntDecodeError
-    if len(filepath) > 0:
-        audiofile = AudioSegment.from_file(filepath)
-    else:
-        if length is None:
-            audiofile = AudioSegment.silent(duration=0, frame_rate=sample_rate)
+    audiofile = None
+    if len(filepath) > 0 and not unprocessed:
+        audiofile = _read_native(filepath, sample_rate=sample_rate, normalize=normalize)
+    if audiofile is None:
+        if len(filepath) > 0:
+            audiofile = AudioSegment.from_file(filepath)
         else:
-            audiofile = AudioSegment.silent(duration=length, frame_rate=sample_rate)
-    if not unprocessed:
-        audiofile = audiofile.set_frame_rate(sample_rate)
-        audiofile = audiofile.set_sample_width(2)
-        audiofile = audiofile.set_channels(1)
-        if normalize:
-            audiofile = effects.normalize(audiofile)
-    else:
+            if length is None:
+                audiofile = AudioSegment.silent(duration=0, frame_rate=sample_rate)
+            else:
+                audiofile = AudioSegment.silent(duration=length, frame_rate=sample_rate)
+        if not unprocessed:
+            audiofile = audiofile.set_frame_rate(sample_rate)
+            audiofile = audiofile.set_sample_width(2)
+            audiofile = audiofile.set_channels(1)
+            if normalize:
+                audiofile = effects.normalize(audiofile)
+    if unprocessed:
         sample_rate = audiofile.frame_rate
     if start_end is not None:
 
@@ -118,6 +130,137 @@ def create_audiosegment(
     return audiofile
 
 
+def _read_native(
+    filepath: str, sample_rate: int, normalize: bool
+) -> typing.Optional[AudioSegment]:
+    """
+    Reads pcm wav files, and 16 bit flac files if soundfile is installed, without ffmpeg
+
+    Gives the same audio as reading with pydub and converting to mono 16 bit at
+    sample_rate. Wav files are memory mapped, and 24 bit samples and files with more
+    than two channels are converted with numpy rather than sample by sample in python.
+    Resampling uses the same audioop functions as pydub.
+
+    Args
+        filepath (str): path to audio file
+        sample_rate (int): sample rate to convert to
+        normalize (bool): normalizes the audio if true
+
+    Returns
+    -------
+        audiofile (AudioSegment): mono 16 bit audio, or None if the file isn't supported
+    """
+    extension = os.path.splitext(filepath)[1].lower()
+    try:
+        if extension == ".wav":
+            frames, sample_width, frame_rate = _read_wav_frames(filepath)
+        elif extension == ".flac" and soundfile is not None:
+            frames, sample_width, frame_rate = _read_flac_frames(filepath)
+        else:
+            return None
+    except (OSError, ValueError, RuntimeError):
+        return None
+    if frames is None:
+        return None
+
+    channels = frames.shape[1]
+    audiofile = AudioSegment(
+        data=frames.tobytes(),
+        sample_width=sample_width,
+        frame_rate=frame_rate,
+        channels=channels,
+    )
+    audiofile = audiofile.set_frame_rate(sample_rate)
+    audiofile = audiofile.set_sample_width(2)
+    if channels > 2:
+        # same as pydub's set_channels(1), sums each channel floor divided by channels
+        frames = np.frombuffer(audiofile._data, np.int16).reshape(-1, channels)
+        channel = (frames // np.int16(channels)).sum(axis=1, dtype=np.int32)
+        if len(channel) > 0 and channel.min() < -32768:
+            return None  # overflows in pydub, which raises the error
+        audiofile = audiofile._spawn(
+            channel.astype(np.int16).tobytes(),
+            overrides={"channels": 1, "frame_width": 2},
+        )
+    else:
+        audiofile = audiofile.set_channels(1)
+    if normalize:
+        audiofile = effects.normalize(audiofile)
+    return audiofile
+
+
+def _read_wav_frames(filepath: str):
+    """
+    Memory maps the frames of a pcm wav file, the way pydub reads wav files
+
+    Returns
+    -------
+        frames, sample_width, frame_rate (array[int], int, int): int16 frames for 16 bit
+        files, otherwise int32 frames, with 24 bit samples converted the way pydub
+        converts them, of shape (frames, channels). frames is None if pydub should
+        read the file
+    """
+    file_size = os.path.getsize(filepath)
+    chunks = {}
+    with open(filepath, "rb") as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:] != b"WAVE":
+            return None, None, None
+        position = 12
+        # pydub reads up to 10 chunks, ending with the data chunk
+        for _ in range(10):
+            if position + 8 > file_size:
+                break
+            f.seek(position)
+            chunk_id, chunk_size = struct.unpack("<4sI", f.read(8))
+            if chunk_id == b"fmt " and chunk_id not in chunks:
+                chunks[chunk_id] = (position, chunk_size, f.read(16))
+            elif chunk_id == b"data":
+                chunks[chunk_id] = (position, chunk_size, None)
+                break
+            position += chunk_size + 8
+    if b"fmt " not in chunks or b"data" not in chunks or chunks[b"fmt "][1] < 16:
+        return None, None, None
+
+    audio_format, channels, frame_rate, _, _, bits_per_sample = struct.unpack(
+        "<HHIIHH", chunks[b"fmt "][2]
+    )
+    if audio_format not in (1, 0xFFFE) or bits_per_sample not in (16, 24, 32):
+        return None, None, None
+    sample_width = bits_per_sample // 8
+    data_position = chunks[b"data"][0] + 8
+    data_size = min(chunks[b"data"][1], file_size - data_position)
+    frame_width = sample_width * channels
+    if channels == 0 or data_size <= 0 or data_size % frame_width != 0:
+        return None, None, None
+
+    num_frames = data_size // frame_width
+    if sample_width == 3:
+        data = np.memmap(
+            filepath, dtype=np.uint8, mode="r", offset=data_position, shape=(num_frames, channels, 3)
+        ).astype(np.uint32)
+        # pydub pads 24 bit samples to 32 bits with a low byte of their sign
+        padding = np.where(data[..., 2] > 127, np.uint32(0xFF), np.uint32(0))
+        frames = (
+            padding | (data[..., 0] << 8) | (data[..., 1] << 16) | (data[..., 2] << 24)
+        ).view(np.int32)
+        return frames, 4, frame_rate
+    dtype = "<i2" if sample_width == 2 else "<i4"
+    frames = np.memmap(
+        filepath, dtype=dtype, mode="r", offset=data_position, shape=(num_frames, channels)
+    )
+    return frames, sample_width, frame_rate
+
+
+def _read_flac_frames(filepath: str):
+    """Reads the frames of a 16 bit flac file with soundfile, frames is None for other flac files"""
+    info = soundfile.info(filepath)
+    if info.subtype != "PCM_16" or info.frames == 0:
+        return None, None, None
+    frames, frame_rate = soundfile.read(filepath, dtype="int16", always_2d=True)
+    return frames, 2, frame_rate
+
+
 def get_audio_files_directory(directory_path: str, full_path: bool = False,
         can_read_extensions: list[str] = BaseConfig.can_read_extensions,
         cant_read_extensions: list[str] = BaseConfig.cant_read_extensions,
@@ -168,6 +311,8 @@ def read(
     """
     Reads any file supported by pydub (ffmpeg) and returns a numpy array and the bit depth
 
+    Decoded files are kept in audalign.decode_cache, unless written to wrdestination
+
     Args
         filename (str): path to audio file
         wrdestination (str): writes the audio file after processing
@@ -180,10 +325,20 @@ def read(
 
     if os.path.splitext(filename)[1] in cant_read_extensions:
         raise CouldntDecodeError
+    if sample_rate is None:
+        sample_rate = BaseConfig.sample_rate
+    key = None
+    if not wrdestination:
+        key = audalign.decode_cache.cache_key(
+            filename, start_end, sample_rate, normalize
+        )
+        data = audalign.decode_cache.get(key)
+        if data is not None:
+            return data, sample_rate
     audiofile = create_audiosegment(
         filename, start_end=start_end, sample_rate=sample_rate, normalize=normalize
     )
-    data = np.frombuffer(audiofile._data, np.int16)
+    data = audalign.decode_cache.put(key, np.frombuffer(audiofile._data, np.int16))
     if wrdestination:
         with open(wrdestination, "wb") as file_place:
             audiofile.export(file_place, format=os.path.splitext(wrdestination)[1][1:])
@@ -291,21 +446,8 @@ def noise_remove_directory(
         **kwargs,
     )
 
-    if use_multiprocessing == True:
-
-        try:
-            nprocesses = num_processes or multiprocessing.cpu_count()
-        except NotImplementedError:
-            nprocesses = 1
-        else:
-            nprocesses = 1 if nprocesses <= 0 else nprocesses
-
-        with multiprocessing.Pool(nprocesses) as pool:
-
-            pool.map(_reduce_noise, file_names)
-
-            pool.close()
-            pool.join()
+    if use_multiprocessing == True and audalign.pool.can_use_pool():
+        audalign.pool.get_pool(num_processes).map(_reduce_noise, file_names)
     else:
         for i in file_names:
             _reduce_noise(i)
@@ -411,21 +553,10 @@ def uniform_level_directory(
         base_config=config,
     )
 
-    if use_multiprocessing == True:
-
-        try:
-            nprocesses = num_processes or multiprocessing.cpu_count()
-        except NotImplementedError:
-            nprocesses = 1
-        else:
-            nprocesses = 1 if nprocesses <= 0 else nprocesses
-
-        with multiprocessing.Pool(nprocesses) as pool:
-
-            pool.map(_uniform_level_, (x[0] for x in find_files(directory)))
-
-            pool.close()
-            pool.join()
+    if use_multiprocessing == True and audalign.pool.can_use_pool():
+        audalign.pool.get_pool(num_processes).map(
+            _uniform_level_, (x[0] for x in find_files(directory))
+        )
     else:
         for i in (x[0] for x in find_files(directory)):
             _uniform_level_(i)
@@ -859,10 +990,9 @@ def get_shifted_file(
     sample_rate=BaseConfig.sample_rate,
     normalize: bool = BaseConfig.normalize,
 ) -> np.array:
-    silence = AudioSegment.silent(offset_seconds * 1000, frame_rate=sample_rate)
-
-    audiofile = create_audiosegment(
-        file_path, sample_rate=sample_rate, normalize=normalize
+    # same length as AudioSegment.silent(offset_seconds * 1000)
+    silence = np.zeros(int(sample_rate * (offset_seconds * 1000 / 1000.0)), np.int16)
+    channel, _ = read(
+        file_path, sample_rate=sample_rate, normalize=normalize, cant_read_extensions=[]
     )
-    audiofile = silence + audiofile
-    return np.frombuffer(audiofile._data, np.int16)
+    return np.concatenate([silence, channel])
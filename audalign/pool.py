@@ -0,0 +1,225 @@
+"""
+Worker pool shared by fingerprinting, recognition, alignment and file processing
+
+The pool is created on first use and reused by later calls, so processes are only
+started and modules only imported once. It's recreated if a different number of
+processes is asked for, and closed at exit or by close_pool.
+
+SharedArray passes large arrays to workers through shared memory instead of pickling
+a copy into every task.
+"""
+
+import atexit
+import collections
+import itertools
+import multiprocessing
+import multiprocessing.pool
+import os
+import typing
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import audalign.decode_cache
+
+_pool: typing.Optional[multiprocessing.pool.Pool] = None
+_pool_processes = None
+_pool_pid = None
+
+
+def num_processes(processes: typing.Optional[int] = None) -> int:
+    """Number of worker processes, all cpus if processes isn't set
+
+    Args:
+        processes (int, optional): number of processes, from config.num_processors
+
+    Returns:
+        [int]: number of processes, at least 1
+    """
+    try:
+        processes = processes or multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+    return 1 if processes <= 0 else processes
+
+
+def get_pool(processes: typing.Optional[int] = None) -> multiprocessing.pool.Pool:
+    """Returns the shared worker pool, creating it if needed
+
+    Args:
+        processes (int, optional): number of processes, all cpus if not set
+
+    Raises:
+        RuntimeError: if called from a pool worker, which can't start processes
+
+    Returns:
+        [multiprocessing.pool.Pool]: shared pool
+    """
+    global _pool, _pool_processes, _pool_pid
+    if multiprocessing.current_process().daemon:
+        raise RuntimeError("worker processes can't use the shared pool")
+    processes = num_processes(processes)
+    if _pool is not None and _pool_pid != os.getpid():
+        # inherited from a parent process, its workers belong to the parent
+        _pool = None
+    if _pool is not None and _pool_processes != processes:
+        close_pool()
+    if _pool is None:
+        if os.name == "posix":
+            # workers share this process's resource tracker, which unregisters blocks
+            # when they're unlinked here. Otherwise each worker starts a tracker of its
+            # own, which unlinks the blocks it mapped again when the worker exits
+            resource_tracker.ensure_running()
+        _pool = multiprocessing.Pool(
+            processes,
+            initializer=audalign.decode_cache._set_settings,
+            initargs=audalign.decode_cache.settings(),
+        )
+        _pool_processes = processes
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def imap(
+    func,
+    iterable,
+    processes: typing.Optional[int] = None,
+    max_in_flight: typing.Optional[int] = None,
+):
+    """Yields (item, func(item)) for each item of iterable in order from the shared pool
+
+    At most max_in_flight items are submitted and not yet yielded, so items are only
+    pickled to workers shortly before they're run, and results are used as they come
+    instead of piling up. Results that finish before earlier items are held until
+    those finish, and still count toward max_in_flight, so a slow item stops new items
+    from being submitted rather than letting finished results pile up behind it.
+
+    Args:
+        func (callable): picklable function of one item
+        iterable (iterable): items
+        processes (int, optional): number of processes, all cpus if not set
+        max_in_flight (int, optional): defaults to twice the number of processes
+
+    Raises:
+        Exception: the first exception raised by func, in the order of iterable
+    """
+    pool = get_pool(processes)
+    max_in_flight = max_in_flight or 2 * num_processes(processes)
+    items = iter(iterable)
+    pending = collections.deque(
+        (item, pool.apply_async(func, (item,)))
+        for item in itertools.islice(items, max_in_flight)
+    )
+    while pending:
+        item, async_result = pending.popleft()
+        result = async_result.get()
+        for next_item in itertools.islice(items, 1):
+            pending.append((next_item, pool.apply_async(func, (next_item,))))
+        yield item, result
+
+
+class SharedArray:
+    """
+    Copy of a numpy array in a shared memory block, for passing to pool workers
+
+    Pickling a SharedArray pickles the name, shape and dtype of its block, so workers
+    map the block rather than receive a copy of the array. The process that created
+    the block owns it and unlinks it on unlink, at the end of a with block, or when
+    garbage collected. Unpickled copies only close their mapping. Arrays from array
+    can't be used after the SharedArray they came from is closed.
+
+    Args
+    ----
+        array (np.ndarray): array to copy into shared memory
+    """
+
+    # set once the block is mapped, __del__ does nothing if creating or mapping it failed
+    _closed = True
+    _owner_pid = None
+
+    def __init__(self, array: np.ndarray):
+        array = np.asarray(array)
+        self._order = (
+            "F" if array.flags.f_contiguous and not array.flags.c_contiguous else "C"
+        )
+        self._shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self._owner_pid = os.getpid()
+        self._closed = False
+        self.shape, self.dtype = array.shape, array.dtype
+        self.array = np.ndarray(
+            self.shape, dtype=self.dtype, buffer=self._shm.buf, order=self._order
+        )
+        self.array[...] = array
+
+    @classmethod
+    def _attach(cls, name: str, shape: tuple, dtype: str, order: str):
+        shared = cls.__new__(cls)
+        shared._order = order
+        shared._shm = shared_memory.SharedMemory(name=name)
+        shared._owner_pid = None
+        shared._closed = False
+        shared.shape, shared.dtype = shape, np.dtype(dtype)
+        shared.array = np.ndarray(
+            shared.shape, dtype=shared.dtype, buffer=shared._shm.buf, order=order
+        )
+        return shared
+
+    def __reduce__(self):
+        return (
+            SharedArray._attach,
+            (self._shm.name, self.shape, self.dtype.str, self._order),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.unlink()
+
+    def __del__(self):
+        self.unlink()
+
+    def close(self) -> None:
+        """Closes this process's mapping of the block"""
+        if self._closed:
+            return
+        self.array = None
+        try:
+            self._shm.close()
+        except BufferError:
+            return  # views of array are still in use, it's closed when they're released
+        self._closed = True
+
+    def unlink(self) -> None:
+        """Closes the mapping, and frees the block if this process created it"""
+        self.close()
+        if self._owner_pid is not None and self._owner_pid == os.getpid():
+            self._owner_pid = None
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def unshare(array):
+    """Array of a SharedArray, other arrays are returned as they are"""
+    return array.array if isinstance(array, SharedArray) else array
+
+
+def can_use_pool() -> bool:
+    """False in pool workers, which run their work serially instead"""
+    return not multiprocessing.current_process().daemon
+
+
+def close_pool() -> None:
+    """Stops the shared pool's workers, a new pool is created on next use"""
+    global _pool, _pool_processes, _pool_pid
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.close()
+        _pool.join()
+    _pool = None
+    _pool_processes = None
+    _pool_pid = None
+
+
+atexit.register(close_pool)
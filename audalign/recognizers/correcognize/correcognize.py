@@ -1,12 +1,16 @@
-import multiprocessing
+import bisect
+import collections
+import contextlib
 import os
 import time
 from functools import partial
 
+import audalign.pool
 import audalign.recognizers.fingerprint.fingerprinter as fingerprinter
 from audalign.config.correlation import CorrelationConfig
 import matplotlib.pyplot as plt
 import numpy as np
+import scipy.fft
 import scipy.signal as signal
 import tqdm
 from audalign.filehandler import find_files, get_shifted_file, read
@@ -67,6 +71,7 @@ def correcognize(
         sos=sos,
         normalize=config.normalize,
         cant_read_extensions=config.cant_read_extensions,
+        float32=config.float32,
     )
     against_array = get_array(
         against_file_path,
@@ -76,6 +81,7 @@ def correcognize(
         sos=sos,
         normalize=config.normalize,
         cant_read_extensions=config.cant_read_extensions,
+        float32=config.float32,
     )
 
     t = time.time()
@@ -141,17 +147,28 @@ def correcognize_directory(
         10, config.freq_threshold, "highpass", fs=config.sample_rate, output="sos"
     )
 
-    if config.multiprocessing is False:
-        target_array = get_array(
-            target_file_path,
-            config.start_end,
-            sample_rate=config.sample_rate,
-            _file_audsegs=_file_audsegs,
-            sos=sos,
-            normalize=config.normalize,
-            cant_read_extensions=config.cant_read_extensions,
-        )
-        target_file_path = (target_file_path, target_array)
+    # decoded once here rather than in every worker
+    target_array = get_array(
+        target_file_path,
+        config.start_end,
+        sample_rate=config.sample_rate,
+        _file_audsegs=_file_audsegs,
+        sos=sos,
+        normalize=config.normalize,
+        cant_read_extensions=config.cant_read_extensions,
+        float32=config.float32,
+    )
+    # transformed once here rather than for every against file
+    target_spectrum = None
+    lag_window = _lag_window(max_lags, config)
+    if (
+        locality is None
+        and config.coarse_factor is None
+        and config.target_spectrum_max_size
+        and TargetSpectrum.nbytes(target_array, lag_window)
+        <= config.target_spectrum_max_size
+    ):
+        target_spectrum = TargetSpectrum(target_array, lag_window)
 
     if type(against_directory) == str:
         against_files = find_files(against_directory)
@@ -160,7 +177,6 @@ def correcognize_directory(
 
     _correcognize_dir_ = partial(
         _correcognize_dir,
-        target_file_path=target_file_path,
         _file_audsegs=_file_audsegs,
         sos_filter=sos,
         filter_matches=filter_matches,
@@ -172,22 +188,36 @@ def correcognize_directory(
         **config.passthrough_args,
     )
 
-    if config.multiprocessing == False:
+    if config.multiprocessing == False or not audalign.pool.can_use_pool():
         results_list = []
         for file_path in against_files:
-            results_list += [_correcognize_dir_(file_path)]
+            results_list += [
+                _correcognize_dir_(
+                    file_path,
+                    target_file_path=(target_file_path, target_array, target_spectrum),
+                )
+            ]
     else:
-        try:
-            nprocesses = config.num_processors or multiprocessing.cpu_count()
-        except NotImplementedError:
-            nprocesses = 1
-        else:
-            nprocesses = 1 if nprocesses <= 0 else nprocesses
-
-        with multiprocessing.Pool(nprocesses) as pool:
-            results_list = pool.map(_correcognize_dir_, tqdm.tqdm(list(against_files)))
-            pool.close()
-            pool.join()
+        pool = audalign.pool.get_pool(config.num_processors)
+        with contextlib.ExitStack() as stack:
+            shared_target_array = stack.enter_context(
+                audalign.pool.SharedArray(target_array)
+            )
+            if target_spectrum is not None:
+                target_spectrum.spectra = stack.enter_context(
+                    audalign.pool.SharedArray(target_spectrum.spectra)
+                )
+            results_list = pool.map(
+                partial(
+                    _correcognize_dir_,
+                    target_file_path=(
+                        target_file_path,
+                        shared_target_array,
+                        target_spectrum,
+                    ),
+                ),
+                tqdm.tqdm(list(against_files)),
+            )
 
     file_match = {}
     for i in results_list:
@@ -200,10 +230,7 @@ def correcognize_directory(
         result["match_time"] = t
         result["match_info"] = file_match
         if _include_filename:
-            if type(target_file_path) == tuple:
-                result["filename"] = target_file_path[0]
-            else:
-                result["filename"] = target_file_path
+            result["filename"] = target_file_path
         return result
     return None
 
@@ -219,6 +246,7 @@ def _correcognize(
     locality_filter_prop: float = None,
     max_lags: float = None,
     config: CorrelationConfig = None,
+    target_spectrum=None,
     **kwargs,
 ):
     print(
@@ -237,15 +265,34 @@ def _correcognize(
         if locality is not None
         else []
     )
-    correlation = calc_corrs(
-        against_array,
-        target_array,
-        locality=locality,
-        indexes=indexes,
-    )
-
-    if locality is None:
-        correlation = list(correlation)[0]
+    if locality is None and config.coarse_factor is not None:
+        correlation = correlate_coarse_to_fine(
+            against_array,
+            target_array,
+            coarse_factor=config.coarse_factor,
+            num_candidates=config.coarse_candidates,
+            radius=int(config.coarse_radius * config.sample_rate),
+            max_lags=max_lags,
+        )
+    else:
+        correlation = calc_corrs(
+            against_array,
+            target_array,
+            locality=locality,
+            indexes=indexes,
+            max_lags=_lag_window(max_lags, config),
+            target_spectrum=target_spectrum,
+            max_spectra_size=config.target_spectrum_max_size or 0,
+        )
+        if locality is None:
+            correlation = list(correlation)[0]
+    plot_correlation = None
+    if config.plot and locality is None:
+        # find_maxes normalizes full correlations in place
+        if isinstance(correlation[0], list):
+            plot_correlation = (np.concatenate(correlation[0]),)
+        else:
+            plot_correlation = (correlation[0].copy(),)
     results_list_tuple, scaling_factor = find_maxes(
         correlation=correlation,
         filter_matches=filter_matches,
@@ -261,11 +308,10 @@ def _correcognize(
     if config.plot:
         if locality is not None:
             print("\nCorrelation Plot not compatible with locality")
-            correlation = None
         plot_cor(
             array_a=target_array,
             array_b=against_array,
-            corr_array=correlation,
+            corr_array=plot_correlation,
             config=config,
             arr_a_title=target_file_path,
             arr_b_title=against_file_path,
@@ -282,6 +328,11 @@ def _correcognize(
     )
 
 
+def _lag_window(max_lags: int, config: CorrelationConfig):
+    """max_lags if only lags within it are correlated, else None"""
+    return max_lags if config.normalize_within_max_lags else None
+
+
 def _correcognize_dir(
     against_file_path,
     target_file_path,
@@ -295,18 +346,8 @@ def _correcognize_dir(
     config: CorrelationConfig,
     **kwargs,
 ):
-    if type(target_file_path) == str:
-        target_array = get_array(
-            target_file_path,
-            config.start_end,
-            sample_rate=config.sample_rate,
-            _file_audsegs=_file_audsegs,
-            sos=sos_filter,
-            normalize=config.normalize,
-            cant_read_extensions=config.cant_read_extensions,
-        )
-    else:
-        target_file_path, target_array = target_file_path
+    target_file_path, target_array, target_spectrum = target_file_path
+    target_array = audalign.pool.unshare(target_array)
 
     against_file_path, _ = against_file_path
 
@@ -321,6 +362,7 @@ def _correcognize_dir(
             sos=sos_filter,
             normalize=config.normalize,
             cant_read_extensions=config.cant_read_extensions,
+            float32=config.float32,
         )
         return _correcognize(
             target_array=target_array,
@@ -333,6 +375,7 @@ def _correcognize_dir(
             locality_filter_prop=locality_filter_prop,
             max_lags=max_lags,
             config=config,
+            target_spectrum=target_spectrum,
             **kwargs,
         )
 
@@ -351,6 +394,7 @@ def get_array(
     sos,
     normalize: bool,
     cant_read_extensions: list[str] = CorrelationConfig.cant_read_extensions,
+    float32: bool = False,
 ):
     if _file_audsegs is not None:
         target_array = get_shifted_file(
@@ -368,7 +412,15 @@ def get_array(
             cant_read_extensions=cant_read_extensions,
         )[0]
     if sos is not None:
-        target_array = signal.sosfilt(sos, target_array)
+        if float32:
+            # sosfilt keeps single precision if both of its inputs are
+            target_array = signal.sosfilt(
+                sos.astype(np.float32), target_array.astype(np.float32)
+            )
+        else:
+            target_array = signal.sosfilt(sos, target_array)
+    elif float32:
+        target_array = target_array.astype(np.float32)
     return target_array
 
 
@@ -408,10 +460,12 @@ def find_index_arr(
             for j in index_list_target:
                 index_pairs += [(i, j)]
     else:
+        # index lists are sorted, so pairs within max_lags are a run of target indexes
+        max_distance = max_lags + locality - 1
         for i in index_list_against:
-            for j in index_list_target:
-                if abs(j - i) <= max_lags + locality - 1:
-                    index_pairs += [(i, j)]
+            start = bisect.bisect_left(index_list_target, i - max_distance)
+            end = bisect.bisect_right(index_list_target, i + max_distance)
+            index_pairs += [(i, j) for j in index_list_target[start:end]]
     return index_pairs
 
 
@@ -420,26 +474,385 @@ def calc_corrs(
     target_array,
     locality: float,
     indexes: list,
+    max_lags: int = None,
+    target_spectrum=None,
+    max_spectra_size: int = None,
 ):
     if locality is None:
-        yield (
-            signal.correlate(against_array, target_array),
-            (against_array.size, target_array.size),
-        )
+        if max_lags is not None:
+            yield correlate_lags(
+                against_array, target_array, -max_lags, max_lags, target_spectrum
+            )
+        elif target_spectrum is not None:
+            yield correlate_overlap_add(against_array, target_array, target_spectrum)
+        else:
+            yield (
+                correlate_full(against_array, target_array),
+                (against_array.size, target_array.size),
+                None,
+            )
     else:
-        locality_a = len(against_array) if locality > len(against_array) else locality
-        locality_b = len(target_array) if locality > len(target_array) else locality
-        for pair in indexes:
-            yield [
-                (
-                    signal.correlate(
-                        against_array[pair[0] : pair[0] + locality_a],
-                        target_array[pair[1] : pair[1] + locality_b],
-                    ),
-                    (locality_a, locality_b),
+        yield from correlate_windows(
+            against_array, target_array, locality, indexes, max_spectra_size
+        )
+
+
+def correlate_windows(
+    against_array,
+    target_array,
+    locality: int,
+    indexes: list,
+    max_spectra_size: int = None,
+):
+    """
+    Correlations of the locality windows of each index pair, like signal.correlate
+
+    Every window is transformed once at the same FFT size, so a pair only costs a
+    product of spectra and an inverse FFT. Pairs from find_index_arr are ordered by
+    against window, so one against spectrum is kept at a time. Target spectra are kept
+    for later pairs, dropping the least recently used past max_spectra_size bytes.
+
+    Args
+    ----
+        against_array (np.ndarray): against samples
+        target_array (np.ndarray): target samples
+        locality (int): window size in samples
+        indexes (list[tuple]): (against index, target index) of each pair of windows
+        max_spectra_size (int, optional): max bytes of kept target spectra
+
+    Yields
+    ------
+        [(correlation, (locality_a, locality_b)), pair] for each pair
+    """
+    locality_a = len(against_array) if locality > len(against_array) else locality
+    locality_b = len(target_array) if locality > len(target_array) else locality
+    fft_size = scipy.fft.next_fast_len(locality_a + locality_b - 1, real=True)
+    # negative lags wrap around to the end of the circular correlation
+    num_negative = locality_b - 1
+    max_spectra = None
+    if max_spectra_size is not None:
+        spectrum_size = (fft_size // 2 + 1) * _complex_dtype(target_array).itemsize
+        max_spectra = max(max_spectra_size // spectrum_size, 1)
+
+    target_spectra = collections.OrderedDict()  # target index -> spectrum
+    against_index, against_spectrum = None, None
+    for pair in indexes:
+        if pair[0] != against_index:
+            against_index = pair[0]
+            against_spectrum = scipy.fft.rfft(
+                against_array[pair[0] : pair[0] + locality_a], fft_size
+            )
+        target_spectrum = target_spectra.get(pair[1])
+        if target_spectrum is None:
+            target_spectrum = np.conj(
+                scipy.fft.rfft(target_array[pair[1] : pair[1] + locality_b], fft_size)
+            )
+            target_spectra[pair[1]] = target_spectrum
+            if max_spectra is not None and len(target_spectra) > max_spectra:
+                target_spectra.popitem(last=False)
+        else:
+            target_spectra.move_to_end(pair[1])
+        circular = scipy.fft.irfft(against_spectrum * target_spectrum, fft_size)
+        yield [
+            (
+                np.concatenate(
+                    [circular[fft_size - num_negative :], circular[:locality_a]]
                 ),
-                pair,
+                (locality_a, locality_b),
+            ),
+            pair,
+        ]
+
+
+PEAK_CHUNK_SIZE = 2**20
+
+
+def correlate_full(against_array, target_array) -> np.ndarray:
+    """
+    Full correlation of against_array and target_array, like signal.correlate
+
+    Spectra are multiplied in place, so long arrays need one less full length
+    temporary than signal.correlate. Short arrays are left to signal.correlate, which
+    can correlate them directly.
+    """
+    if against_array.size * target_array.size < 2**20:
+        return signal.correlate(against_array, target_array)
+    size = against_array.size + target_array.size - 1
+    fft_size = scipy.fft.next_fast_len(size, real=True)
+    spectrum = scipy.fft.rfft(against_array, fft_size)
+    target_spectrum = scipy.fft.rfft(target_array, fft_size)
+    spectrum *= np.conjugate(target_spectrum, out=target_spectrum)
+    del target_spectrum
+    circular = scipy.fft.irfft(spectrum, fft_size)
+    del spectrum
+    # negative lags wrap around to the end of the circular correlation
+    num_negative = target_array.size - 1
+    correlation = np.empty(size, dtype=circular.dtype)
+    correlation[:num_negative] = circular[fft_size - num_negative :]
+    correlation[num_negative:] = circular[: against_array.size]
+    return correlation
+
+
+class TargetSpectrum:
+    """
+    FFTs of a target, computed once to correlate it with many against arrays
+
+    The FFT size only depends on the target and max_lags, so every against array
+    reuses the same spectra. Without max_lags, the whole target is transformed and
+    correlated with blocks of against arrays by correlate_overlap_add. With max_lags,
+    blocks of the target are transformed, as correlated by correlate_lags.
+
+    spectra can be replaced with an audalign.pool.SharedArray of it to pass to workers.
+
+    Args
+    ----
+        target_array (np.ndarray): target samples
+        max_lags (int, optional): max lag in samples
+    """
+
+    def __init__(self, target_array: np.ndarray, max_lags: int = None):
+        self.max_lags = max_lags
+        self.block_size, self.fft_size, num_blocks = self.layout(
+            target_array.size, max_lags
+        )
+        self.spectra = np.empty(
+            (num_blocks, self.fft_size // 2 + 1), dtype=_complex_dtype(target_array)
+        )
+        for i in range(num_blocks):
+            if max_lags is None:
+                block = target_array
+            else:
+                block = target_array[i * self.block_size : (i + 1) * self.block_size]
+            self.spectra[i] = np.conj(scipy.fft.rfft(block, self.fft_size))
+
+    @staticmethod
+    def layout(target_size: int, max_lags: int = None) -> tuple:
+        """(block_size, fft_size, num_blocks) of a target's spectra"""
+        if max_lags is None:
+            fft_size = scipy.fft.next_fast_len(2 * target_size - 1, real=True)
+            return fft_size - target_size + 1, fft_size, 1
+        min_lag = max(-max_lags, -(target_size - 1))
+        block_size, fft_size = _lag_block_sizes(max_lags - min_lag + 1)
+        return block_size, fft_size, -(-target_size // block_size)
+
+    @classmethod
+    def nbytes(cls, target_array: np.ndarray, max_lags: int = None) -> int:
+        """Bytes of the spectra of a target"""
+        _, fft_size, num_blocks = cls.layout(target_array.size, max_lags)
+        return num_blocks * (fft_size // 2 + 1) * _complex_dtype(target_array).itemsize
+
+
+def correlate_overlap_add(
+    against_array, target_array, target_spectrum: TargetSpectrum
+):
+    """
+    Full correlation of against_array and target_array, like signal.correlate
+
+    Blocks of against_array are correlated with the target's precomputed spectrum
+    and added up, so the target isn't transformed again for every against array.
+    against_arrays much shorter than the target are correlated directly instead,
+    as padding them to the target's FFT size costs more than transforming the target.
+
+    Returns
+    -------
+        correlation (np.ndarray): full correlation
+        len_tups (tuple): sizes of against_array and target_array
+        first_lag (None): correlation holds every lag
+    """
+    len_tups = (against_array.size, target_array.size)
+    block_size, fft_size = target_spectrum.block_size, target_spectrum.fft_size
+    num_blocks = -(-against_array.size // block_size)
+    if 2 * num_blocks * fft_size > 3 * scipy.fft.next_fast_len(
+        against_array.size + target_array.size - 1, real=True
+    ):
+        return correlate_full(against_array, target_array), len_tups, None
+
+    spectrum = audalign.pool.unshare(target_spectrum.spectra)[0]
+    # negative lags of each block wrap around to the end of its circular correlation
+    num_negative = target_array.size - 1
+    correlation = np.zeros(
+        against_array.size + num_negative, _real_dtype(against_array, target_array)
+    )
+    for start in range(0, against_array.size, block_size):
+        block = against_array[start : start + block_size]
+        block_correlation = scipy.fft.irfft(
+            scipy.fft.rfft(block, fft_size) * spectrum, fft_size
+        )
+        correlation[start + num_negative : start + num_negative + block.size] += (
+            block_correlation[: block.size]
+        )
+        if num_negative > 0:
+            correlation[start : start + num_negative] += block_correlation[
+                fft_size - num_negative :
             ]
+    return correlation, len_tups, None
+
+
+def correlate_lags(
+    against_array,
+    target_array,
+    min_lag: int,
+    max_lag: int,
+    target_spectrum: TargetSpectrum = None,
+):
+    """
+    Correlation of against_array and target_array at lags from min_lag to max_lag
+
+    Lags are clipped to the lags of the full correlation. Blocks of target_array are
+    correlated with the part of against_array they overlap within those lags, so the
+    work scales with the length of target_array and the number of lags rather than the
+    combined length of both arrays. Falls back to slicing the full correlation if the
+    lags cover most of it.
+
+    Args
+    ----
+        against_array (np.ndarray): against samples
+        target_array (np.ndarray): target samples
+        min_lag (int): first lag
+        max_lag (int): last lag
+        target_spectrum (TargetSpectrum, optional): spectra of target_array's blocks,
+            made with max_lags of -min_lag == max_lag, transformed here if not given
+
+    Returns
+    -------
+        correlation (np.ndarray): correlation at each lag
+        len_tups (tuple): sizes of against_array and target_array
+        first_lag (int): lag of correlation[0]
+    """
+    len_tups = (against_array.size, target_array.size)
+    min_lag = max(min_lag, -(target_array.size - 1))
+    num_lags = min(max_lag, against_array.size - 1) - min_lag + 1
+    if 2 * num_lags >= against_array.size + target_array.size - 1:
+        start = min_lag + target_array.size - 1
+        correlation = correlate_full(against_array, target_array)
+        return correlation[start : start + num_lags], len_tups, min_lag
+
+    # blocks only depend on the target's lags, so target spectra can be reused
+    block_size, fft_size = _lag_block_sizes(max_lag - min_lag + 1)
+    spectra = (
+        audalign.pool.unshare(target_spectrum.spectra)
+        if target_spectrum is not None
+        else None
+    )
+    dtype = _real_dtype(against_array, target_array)
+    correlation = np.zeros(max_lag - min_lag + 1, dtype)
+    for i, start in enumerate(range(0, target_array.size, block_size)):
+        block = target_array[start : start + block_size]
+        # against samples block overlaps at lags min_lag to max_lag
+        seg_start = start + min_lag
+        seg_end = start + block.size + max_lag
+        if seg_end <= 0 or seg_start >= against_array.size:
+            continue
+        segment = np.zeros(seg_end - seg_start, dtype)
+        overlap_start = max(seg_start, 0)
+        overlap_end = min(seg_end, against_array.size)
+        segment[
+            overlap_start - seg_start : overlap_end - seg_start
+        ] = against_array[overlap_start:overlap_end]
+        block_spectrum = (
+            spectra[i]
+            if spectra is not None
+            else np.conj(scipy.fft.rfft(block, fft_size))
+        )
+        correlation += scipy.fft.irfft(
+            scipy.fft.rfft(segment, fft_size) * block_spectrum, fft_size
+        )[: correlation.size]
+    return correlation[:num_lags], len_tups, min_lag
+
+
+def correlate_coarse_to_fine(
+    against_array,
+    target_array,
+    coarse_factor: int,
+    num_candidates: int,
+    radius: int,
+    max_lags: int = None,
+):
+    """
+    Correlation at the lags around the highest peaks of a lower rate correlation
+
+    Both arrays are resampled to 1 / coarse_factor of their rate and correlated in
+    full, or within max_lags. Lags within radius of the num_candidates highest coarse
+    peaks are then correlated at the full rate with correlate_lags, overlapping
+    windows merged. Peaks further than radius from every candidate are missed, so
+    radius should cover the spread of matches around the best one.
+
+    Args
+    ----
+        against_array (np.ndarray): against samples
+        target_array (np.ndarray): target samples
+        coarse_factor (int): resampling factor of the coarse correlation
+        num_candidates (int): number of coarse peaks to refine
+        radius (int): lags refined on each side of a candidate, in samples
+        max_lags (int, optional): max lag in samples
+
+    Returns
+    -------
+        correlations (list[np.ndarray]): correlation of each window of lags
+        len_tups (tuple): sizes of against_array and target_array
+        first_lags (list[int]): lag of the start of each window
+    """
+    len_tups = (against_array.size, target_array.size)
+    min_lag, max_lag = -(target_array.size - 1), against_array.size - 1
+    if max_lags is not None:
+        min_lag, max_lag = max(min_lag, -max_lags), min(max_lag, max_lags)
+
+    coarse_against = signal.resample_poly(against_array, 1, coarse_factor)
+    coarse_target = signal.resample_poly(target_array, 1, coarse_factor)
+    coarse_max_lags = None if max_lags is None else -(-max_lags // coarse_factor)
+    if coarse_max_lags is None:
+        coarse_correlation = correlate_full(coarse_against, coarse_target)
+        coarse_first_lag = -(coarse_target.size - 1)
+    else:
+        coarse_correlation, _, coarse_first_lag = correlate_lags(
+            coarse_against, coarse_target, -coarse_max_lags, coarse_max_lags
+        )
+    coarse_peaks, _ = signal.find_peaks(coarse_correlation)
+    if len(coarse_peaks) == 0:
+        coarse_peaks = np.array([np.argmax(coarse_correlation)])
+    properties = {"peak_heights": coarse_correlation[coarse_peaks]}
+    candidates = sorted(
+        (lag + coarse_first_lag) * coarse_factor
+        for lag, _ in _sort_peaks(coarse_peaks, properties, num_candidates)
+    )
+
+    # a coarse lag stands for coarse_factor lags at the full rate
+    radius += coarse_factor
+    windows = []  # [first lag, last lag]
+    for candidate in candidates:
+        start = max(candidate - radius, min_lag)
+        end = min(candidate + radius, max_lag)
+        if start > end:
+            continue
+        if len(windows) > 0 and start <= windows[-1][1] + 2:
+            windows[-1][1] = max(windows[-1][1], end)
+        else:
+            windows += [[start, end]]
+
+    correlations = [
+        correlate_lags(against_array, target_array, start, end)[0]
+        for start, end in windows
+    ]
+    return correlations, len_tups, [start for start, _ in windows]
+
+
+def _real_dtype(*arrays) -> np.dtype:
+    """float32 if every array is, as scipy.fft keeps single precision, else float64"""
+    if all(x.dtype == np.float32 for x in arrays):
+        return np.dtype(np.float32)
+    return np.dtype(np.float64)
+
+
+def _complex_dtype(*arrays) -> np.dtype:
+    """Dtype of the rfft of arrays"""
+    return np.result_type(_real_dtype(*arrays), np.complex64)
+
+
+def _lag_block_sizes(num_lags: int) -> tuple:
+    """(block_size, fft_size) of target blocks correlated at num_lags lags"""
+    block_size = max(8 * num_lags, 2**14)
+    # circular correlation of a block is the same as linear at the lags kept
+    return block_size, scipy.fft.next_fast_len(block_size + num_lags - 1, real=True)
 
 
 def find_maxes(
@@ -458,6 +871,7 @@ def find_maxes(
         return _find_peaks(
             correlation=correlation[0],
             len_tups=correlation[1],
+            first_lag=correlation[2],
             filter_matches=filter_matches,
             match_len_filter=match_len_filter,
             max_lags=max_lags,
@@ -497,37 +911,151 @@ def _find_peaks(
     max_lags: float,
     SCALING_16_BIT: int,
     index_pair: tuple = None,
+    first_lag: int = None,
     **kwargs,
 ):
-    """This is where kwargs go. returns zip of peak indices and their heights sorted by height"""
+    """This is where kwargs go. returns zip of peak indices and their heights sorted by height
+
+    If first_lag is set, correlation only holds the lags within max_lags from first_lag,
+    as from correlate_lags, and heights are relative to the largest of those. Both are
+    lists of windows from correlate_coarse_to_fine.
+    """
+    if first_lag is not None:
+        return _find_lag_window_peaks(
+            windows=(
+                list(zip(first_lag, correlation))
+                if isinstance(first_lag, list)
+                else [(first_lag, correlation)]
+            ),
+            len_tups=len_tups,
+            filter_matches=filter_matches,
+            match_len_filter=match_len_filter,
+            SCALING_16_BIT=SCALING_16_BIT,
+            **kwargs,
+        )
     max_corr = np.max(correlation)
-    scaling_factor = max_corr / len(correlation) / SCALING_16_BIT
-    correlation = (
-        correlation / np.max(np.abs(correlation), axis=0)
-        if max_corr > 0
-        else correlation
-    )
-    lag_array = signal.correlation_lags(len_tups[0], len_tups[1], mode="full")
+    scaling_factor = float(max_corr) / len(correlation) / SCALING_16_BIT
+    # normalized in place, correlations can be as long as both files
+    if max_corr > 0:
+        correlation /= max(max_corr, -np.min(correlation))
+    # lag of correlation[i] is i + first_lag, like signal.correlation_lags
+    first_lag = -(len_tups[1] - 1)
     if max_lags is not None:
         shift = 0
         if index_pair is not None:
             shift = index_pair[0] - index_pair[1]
-        if np.max(lag_array) > max_lags - shift:
-            correlation[np.where(lag_array == (max_lags - shift))[0][0] + 1 :] = 0
-        if np.min(lag_array) < -max_lags - shift:
-            correlation[: np.where(lag_array == (-max_lags - shift))[0][0]] = 0
+        if len_tups[0] - 1 > max_lags - shift:
+            correlation[max(max_lags - shift - first_lag + 1, 0) :] = 0
+        if first_lag < -max_lags - shift:
+            correlation[: max(-max_lags - shift - first_lag, 0)] = 0
 
     # https://docs.scipy.org/doc/scipy/reference/generated/scipy.signal.find_peaks.html
-    peaks, properties = signal.find_peaks(correlation, height=filter_matches, **kwargs)
-    peaks = [lag_array[x] for x in peaks]
-    peaks_tuples = zip(peaks, properties["peak_heights"])
-    peaks_tuples = sorted(peaks_tuples, key=lambda x: x[1], reverse=True)
+    peaks, properties = _find_peaks_in_chunks(
+        correlation, height=filter_matches, **kwargs
+    )
+    peaks = peaks + first_lag
+    return _sort_peaks(peaks, properties, match_len_filter), scaling_factor
+
+
+def _find_lag_window_peaks(
+    windows: list,
+    len_tups: tuple,
+    filter_matches: float,
+    match_len_filter: int,
+    SCALING_16_BIT: int,
+    **kwargs,
+):
+    """Peaks of [(first_lag, correlation)] windows of lags, in order of lag"""
+    max_corr = max(np.max(x[1]) for x in windows)
+    max_abs_corr = max(max_corr, -min(np.min(x[1]) for x in windows))
+    # scaled by the length of the full correlation, like _find_peaks
+    scaling_factor = (
+        float(max_corr) / (len_tups[0] + len_tups[1] - 1) / SCALING_16_BIT
+    )
+
+    peaks, heights = [], []
+    for first_lag, correlation in windows:
+        # lags outside the windows are zero, as in _find_peaks
+        pad_start = int(first_lag > -(len_tups[1] - 1))
+        pad_end = int(first_lag + len(correlation) < len_tups[0])
+        padded = np.zeros(pad_start + len(correlation) + pad_end, correlation.dtype)
+        padded[pad_start : pad_start + len(correlation)] = correlation
+        if max_corr > 0:
+            padded /= max_abs_corr
+        window_peaks, properties = signal.find_peaks(
+            padded, height=filter_matches, **kwargs
+        )
+        peaks += [window_peaks + (first_lag - pad_start)]
+        heights += [properties["peak_heights"]]
+    return (
+        _sort_peaks(
+            np.concatenate(peaks),
+            {"peak_heights": np.concatenate(heights)},
+            match_len_filter,
+        ),
+        scaling_factor,
+    )
+
+
+def _find_peaks_in_chunks(
+    correlation: np.ndarray,
+    height: float,
+    chunk_size: int = PEAK_CHUNK_SIZE,
+    **kwargs,
+):
+    """
+    signal.find_peaks of correlation, run over chunks if there are no kwargs
+
+    find_peaks copies its input to float64, so long float32 correlations are split
+    into chunks that don't split plateaus. Without kwargs a sample is a peak or not
+    from its neighbors and plateau alone, so the peaks are the same.
+    """
+    if len(kwargs) > 0 or len(correlation) <= chunk_size:
+        return signal.find_peaks(correlation, height=height, **kwargs)
+    peaks, heights = [], []
+    start = 0
+    while start < len(correlation):
+        end = _next_change(correlation, start + chunk_size)
+        # neighbors on each side, which find_peaks never returns as peaks
+        offset = max(start - 1, 0)
+        chunk_peaks, properties = signal.find_peaks(
+            correlation[offset : end + 1], height=height
+        )
+        peaks += [chunk_peaks + offset]
+        heights += [properties["peak_heights"]]
+        start = end
+    return np.concatenate(peaks), {"peak_heights": np.concatenate(heights)}
+
+
+def _next_change(correlation: np.ndarray, index: int) -> int:
+    """First i from index where correlation[i] != correlation[i - 1], or the length"""
+    step = 1024
+    while index < len(correlation):
+        length = min(step, len(correlation) - index)
+        changes = np.flatnonzero(
+            correlation[index : index + length]
+            != correlation[index - 1 : index - 1 + length]
+        )
+        if len(changes) > 0:
+            return index + changes[0]
+        index += length
+        step *= 2
+    return len(correlation)
+
 
+def _sort_peaks(peaks: np.ndarray, properties: dict, match_len_filter: int):
+    """(lag, height) of the match_len_filter highest peaks, highest first"""
     if match_len_filter is None:
         match_len_filter = 30
-    if len(peaks_tuples) > match_len_filter:
-        peaks_tuples = peaks_tuples[:match_len_filter]
-    return peaks_tuples, scaling_factor
+    heights = properties["peak_heights"].astype(np.float64, copy=False)
+    candidates = np.arange(len(heights))
+    if 0 < match_len_filter < len(heights):
+        # highest peaks, and every peak tied with the lowest of them
+        cutoff = len(heights) - match_len_filter
+        candidates = np.flatnonzero(heights >= np.partition(heights, cutoff)[cutoff])
+    # stable, so equal heights keep lag order
+    order = candidates[np.argsort(-heights[candidates], kind="stable")]
+    return [(peaks[i], heights[i]) for i in order[:match_len_filter]]
 
 
 def process_loc_peaks(
@@ -1,9 +1,9 @@
-import multiprocessing
 import os
 import time
 from functools import partial
 import typing
 
+import audalign.pool
 import audalign.recognizers.fingerprint.fingerprinter as fingerprinter
 from audalign.config.correlation_spectrogram import CorrelationSpectrogramConfig
 import matplotlib.pyplot as plt
@@ -138,15 +138,14 @@ def correcognize_directory(
         10, config.freq_threshold, "highpass", fs=config.sample_rate, output="sos"
     )
 
-    if config.multiprocessing is False:
-        target_array = get_array(
-            target_file_path,
-            config.start_end,
-            config=config,
-            _file_audsegs=_file_audsegs,
-            sos=sos,
-        )
-        target_file_path = (target_file_path, target_array)
+    # decoded once here rather than in every worker
+    target_array = get_array(
+        target_file_path,
+        config.start_end,
+        config=config,
+        _file_audsegs=_file_audsegs,
+        sos=sos,
+    )
 
     if type(against_directory) == str:
         against_files = find_files(against_directory)
@@ -155,7 +154,6 @@ def correcognize_directory(
 
     _correcognize_dir_ = partial(
         _correcognize_dir,
-        target_file_path=target_file_path,
         _file_audsegs=_file_audsegs,
         sos_filter=sos,
         filter_matches=filter_matches,
@@ -167,22 +165,24 @@ def correcognize_directory(
         **config.passthrough_args,
     )
 
-    if config.multiprocessing == False:
+    if config.multiprocessing == False or not audalign.pool.can_use_pool():
         results_list = []
         for file_path in against_files:
-            results_list += [_correcognize_dir_(file_path)]
+            results_list += [
+                _correcognize_dir_(
+                    file_path, target_file_path=(target_file_path, target_array)
+                )
+            ]
     else:
-        try:
-            nprocesses = config.num_processors or multiprocessing.cpu_count()
-        except NotImplementedError:
-            nprocesses = 1
-        else:
-            nprocesses = 1 if nprocesses <= 0 else nprocesses
-
-        with multiprocessing.Pool(nprocesses) as pool:
-            results_list = pool.map(_correcognize_dir_, tqdm.tqdm(list(against_files)))
-            pool.close()
-            pool.join()
+        pool = audalign.pool.get_pool(config.num_processors)
+        with audalign.pool.SharedArray(target_array) as shared_target_array:
+            results_list = pool.map(
+                partial(
+                    _correcognize_dir_,
+                    target_file_path=(target_file_path, shared_target_array),
+                ),
+                tqdm.tqdm(list(against_files)),
+            )
 
     file_match = {}
     for i in results_list:
@@ -195,10 +195,7 @@ def correcognize_directory(
         result["match_time"] = t
         result["match_info"] = file_match
         if _include_filename:
-            if type(target_file_path) == tuple:
-                result["filename"] = target_file_path[0]
-            else:
-                result["filename"] = target_file_path
+            result["filename"] = target_file_path
         return result
     return None
 
@@ -299,16 +296,8 @@ def _correcognize_dir(
     config: CorrelationSpectrogramConfig,
     **kwargs,
 ):
-    if type(target_file_path) == str:
-        target_array = get_array(
-            target_file_path,
-            config.start_end,
-            config=config,
-            _file_audsegs=_file_audsegs,
-            sos=sos_filter,
-        )
-    else:
-        target_file_path, target_array = target_file_path
+    target_file_path, target_array = target_file_path
+    target_array = audalign.pool.unshare(target_array)
 
     against_file_path, _ = against_file_path
 
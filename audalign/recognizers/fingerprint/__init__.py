@@ -1,12 +1,25 @@
+import audalign.pool
 from audalign.recognizers import BaseRecognizer
 from audalign.config.fingerprint import FingerprintConfig
 import audalign.filehandler as filehandler
 import audalign.recognizers.fingerprint.recognize as recognize
 import audalign.recognizers.fingerprint.fingerprinter as fingerprinter
+from audalign.recognizers.fingerprint.hash_index import HashIndex
+from audalign.recognizers.fingerprint.shards import ShardedHashIndex
+from audalign.recognizers.fingerprint.fingerprint_cache import (
+    FingerprintCache,
+    _cached_fingerprint_worker,
+)
+import audalign.recognizers.fingerprint.fingerprint_db as fingerprint_db
+import audalign.recognizers.fingerprint.fingerprint_library as fingerprint_library
+from audalign.recognizers.fingerprint.file_registry import (
+    FileNamesView,
+    FingerprintedFilesView,
+)
 
 import os
-import multiprocessing
 from functools import partial
+import tqdm
 import pickle
 import json
 import typing
@@ -15,8 +28,6 @@ from pydub.exceptions import CouldntDecodeError
 
 class FingerprintRecognizer(BaseRecognizer):
     config: FingerprintConfig
-    file_names = []
-    fingerprinted_files = []
     total_fingerprints = 0
     temp_fingerprints_list = []
 
@@ -24,14 +35,26 @@ class FingerprintRecognizer(BaseRecognizer):
         self, config: FingerprintConfig = None, load_fingerprints_file: str = None
     ):
         self.config = FingerprintConfig() if config is None else config
-        self.file_names = []
-        self.fingerprinted_files = []
+        self._files = {}  # name -> hashes, in the order files were added
+        self._names_list = None  # list of _files, rebuilt after files change
         self.total_fingerprints = 0
         self.temp_fingerprints_list = []
+        self._hash_index = HashIndex()  # built by the first recognition
+        self._shards = None
 
         if load_fingerprints_file is not None:
             self.load_fingerprinted_files(load_fingerprints_file)
 
+    @property
+    def file_names(self) -> FileNamesView:
+        """Names of fingerprinted files, a list like view with constant time "in" """
+        return FileNamesView(self)
+
+    @property
+    def fingerprinted_files(self) -> FingerprintedFilesView:
+        """[name, hashes] of fingerprinted files, a list like view"""
+        return FingerprintedFilesView(self)
+
     def align_stat_print(self):
         print()
         print(f"Total fingerprints: {self.total_fingerprints}")
@@ -89,9 +112,11 @@ class FingerprintRecognizer(BaseRecognizer):
         -------
         None
         """
-        self.file_names = []
-        self.fingerprinted_files = []
+        self._files.clear()
+        self._names_list = None
         self.total_fingerprints = 0
+        self._hash_index.clear()
+        self.close_recognition_shards()
 
     def align_get_file_names(
         self,
@@ -104,9 +129,10 @@ class FingerprintRecognizer(BaseRecognizer):
             file_names = filehandler.get_audio_files_directory(file_dir, full_path=True, can_read_extensions=self.config.can_read_extensions, cant_read_extensions=self.config.cant_read_extensions)
         elif fine_aud_file_dict:
             file_names = fine_aud_file_dict.keys()
-            for name, fingerprints in zip(self.file_names, self.fingerprinted_files):
-                self.temp_fingerprints_list.append([name, fingerprints])
-                self.clear_fingerprints()
+            self.temp_fingerprints_list.extend(
+                [name, [name, hashes]] for name, hashes in self._files.items()
+            )
+            self.clear_fingerprints()
         else:
             file_names = file_list
 
@@ -115,7 +141,7 @@ class FingerprintRecognizer(BaseRecognizer):
         if not fine_aud_file_dict:
             set_file_name_list = set([os.path.basename(x) for x in file_names])
             self.temp_fingerprints_list = []
-            for name in list(self.file_names):
+            for name in list(self._files):
                 if name not in set_file_name_list:
                     self.temp_fingerprints_list.append(self.pop_filename(name))
 
@@ -167,14 +193,14 @@ class FingerprintRecognizer(BaseRecognizer):
         if os.path.isdir(file_path):
             raise ValueError(f"file_path {file_path} must be a file")
         to_fingerprint = []
-        if os.path.basename(file_path) not in self.file_names:
+        if os.path.basename(file_path) not in self._files:
             to_fingerprint += [file_path]
         if against_path is not None:
             if os.path.isdir(against_path):
                 for path in filehandler.get_audio_files_directory(
                     against_path, full_path=True, can_read_extensions=self.config.can_read_extensions, cant_read_extensions=self.config.cant_read_extensions
                 ):
-                    if path not in self.file_names and path not in to_fingerprint:
+                    if path not in self._files and path not in to_fingerprint:
                         to_fingerprint += [path]
             elif os.path.isfile(against_path):
                 if filehandler.check_is_audio_file(against_path, 
@@ -214,17 +240,11 @@ class FingerprintRecognizer(BaseRecognizer):
         None
         """
 
-        result = self._fingerprint_directory(path, _file_audsegs=_file_audsegs)
-
-        if result:
-            for processed_file in result:
-                if (
-                    processed_file[0] != None
-                    and processed_file[0] not in self.file_names
-                ):
-                    self.fingerprinted_files.append(processed_file)
-                    self.file_names.append(processed_file[0])
-                    self.total_fingerprints += len(processed_file[1])
+        for file_name, hashes in self._fingerprint_directory(
+            path, _file_audsegs=_file_audsegs
+        ):
+            if file_name != None:
+                self._add_file(file_name, hashes)
 
     def _fingerprint_directory(
         self,
@@ -234,15 +254,18 @@ class FingerprintRecognizer(BaseRecognizer):
         """
         Worker function for fingerprint_directory
 
-        Fingerprints all files in given directory and all subdirectories
+        Fingerprints all files in given directory and all subdirectories. With
+        multiprocessing, at most config.max_in_flight files are in worker processes at
+        once, counting files that finished before earlier files and are held until those
+        finish. Files are yielded in the order they were found
 
         Args
         ----
             path (str): path to directory to be fingerprinted
 
-        Returns
-        -------
-        None
+        Yields
+        ------
+        [file_name, hashes]
         """
         if type(path) == str:
             file_names = filehandler.find_files(path, self.config.extensions)
@@ -256,7 +279,7 @@ class FingerprintRecognizer(BaseRecognizer):
         filenames_to_fingerprint = []
         for filename, _ in file_names:  # finds all files to fingerprint
             file_name = os.path.basename(filename)
-            if file_name in self.file_names:
+            if file_name in self._files:
                 print(f"{file_name} already fingerprinted")
                 one_file_already_fingerprinted = True
                 continue
@@ -271,6 +294,7 @@ class FingerprintRecognizer(BaseRecognizer):
                     raise CouldntDecodeError("Directory contains 0 files or could not be found")
             return
 
+        cache = self._fingerprint_cache() if _file_audsegs is None else None
         if _file_audsegs is not None:
             filenames_to_fingerprint = [
                 (filename, _file_audsegs[filename])
@@ -278,44 +302,45 @@ class FingerprintRecognizer(BaseRecognizer):
             ]
 
         _fingerprint_worker_directory = partial(
-            fingerprinter._fingerprint_worker,
+            _cached_fingerprint_worker,
             config=self.config,
+            cache=cache,
         )
 
-        if self.config.multiprocessing == True:
-
-            # Try to use the maximum amount of processes if not given.
-            try:
-                nprocesses = self.config.num_processors or multiprocessing.cpu_count()
-            except NotImplementedError:
-                nprocesses = 1
-            else:
-                nprocesses = 1 if nprocesses <= 0 else nprocesses
+        if self.config.multiprocessing == True and audalign.pool.can_use_pool():
 
-            with multiprocessing.Pool(nprocesses) as self.pool:
-
-                result = self.pool.map(
-                    _fingerprint_worker_directory, filenames_to_fingerprint
-                )
-
-                self.pool.close()
-                self.pool.join()
+            # Uses the maximum amount of processes if not given.
+            results = audalign.pool.imap(
+                _fingerprint_worker_directory,
+                filenames_to_fingerprint,
+                processes=self.config.num_processors,
+                max_in_flight=self.config.max_in_flight,
+            )
+            for item, (file_name, hashes, cached) in tqdm.tqdm(
+                results, total=len(filenames_to_fingerprint)
+            ):
+                if cached:
+                    print(f"{file_name} loaded from fingerprint cache")
+                elif cache is not None:
+                    cache.put(item, self.config, hashes)
+                if file_name is not None:
+                    yield [file_name, hashes]
 
         else:
 
-            result = []
-
-            for filename in filenames_to_fingerprint:
-                if isinstance(filename, str): # fine alignments are tuples with offsets
-                    file_name = os.path.basename(filename)
-                    if file_name in self.file_names:
+            for item in filenames_to_fingerprint:
+                if isinstance(item, str): # fine alignments are tuples with offsets
+                    file_name = os.path.basename(item)
+                    if file_name in self._files:
                         print(f"{file_name} already fingerprinted, continuing...")
                         continue
-                file_name, hashes = _fingerprint_worker_directory(filename)
-                if file_name == None:
-                    continue
-                result.append([file_name, hashes])
-        return result
+                file_name, hashes, cached = _fingerprint_worker_directory(item)
+                if cached:
+                    print(f"{file_name} loaded from fingerprint cache")
+                elif cache is not None:
+                    cache.put(item, self.config, hashes)
+                if file_name is not None:
+                    yield [file_name, hashes]
 
     def fingerprint_file(
         self,
@@ -335,7 +360,7 @@ class FingerprintRecognizer(BaseRecognizer):
         None
         """
         file_name = os.path.basename(file_path)
-        if file_name in self.file_names:
+        if file_name in self._files:
             print(f"{file_name} already fingerprinted")
             return None
 
@@ -344,9 +369,7 @@ class FingerprintRecognizer(BaseRecognizer):
             set_file_name=set_file_name,
         )
         if file_name is not None and hashes is not None:
-            self.fingerprinted_files.append([file_name, hashes])
-            self.file_names.append(file_name)
-            self.total_fingerprints += len(hashes)
+            self._add_file(file_name, hashes)
 
     def _fingerprint_file(
         self,
@@ -368,39 +391,86 @@ class FingerprintRecognizer(BaseRecognizer):
         [file_name, hashes]
         """
 
-        file_name, hashes = fingerprinter._fingerprint_worker(
-            file_path,
-            config=self.config,
-        )
+        cache = self._fingerprint_cache()
+        hashes = None if cache is None else cache.get(file_path, self.config)
+        if hashes is not None:
+            file_name = os.path.basename(file_path)
+            print(f"{file_name} loaded from fingerprint cache")
+        else:
+            file_name, hashes = fingerprinter._fingerprint_worker(
+                file_path,
+                config=self.config,
+            )
+            if cache is not None:
+                cache.put(file_path, self.config, hashes)
         file_name = set_file_name or file_name
         return [file_name, hashes]
 
+    def _fingerprint_cache(self):
+        """Returns the on disk fingerprint cache if config.cache_dir is set"""
+        if self.config.cache_dir is None:
+            return None
+        return FingerprintCache(self.config.cache_dir, self.config.cache_max_size)
+
     def save_fingerprinted_files(self, filename: str) -> None:
         """
-        Serializes fingerprinted files to json or pickle file
+        Serializes fingerprinted files to json, pickle, or fpdb file, or fplib directory
+
+        Packed fingerprints are written to json as hash dicts. fpdb files are columnar
+        fingerprint databases that open much faster than json or pickle, and are
+        searched on disk instead of being loaded into memory. fplib directories are
+        libraries of fpdb segments. Saving to a loaded fplib only writes the files
+        fingerprinted since, and marks popped files as removed
 
         Args
         ----
-            filename (str): file to load saved fingerprints from
+            filename (str): file to save fingerprints to
         """
 
-        data = [self.fingerprinted_files, self.total_fingerprints, self.file_names]
+        data = [None, self.total_fingerprints, list(self.file_names)]
         if filename.split(".")[-1] == "pickle":
+            data[0] = [
+                [name, fingerprinter.pack_hashes(hashes)]
+                if isinstance(hashes, fingerprinter.StoredHashes)
+                else [name, hashes]
+                for name, hashes in self.fingerprinted_files
+            ]
             with open(filename, "wb") as f:
                 pickle.dump(data, f)
         elif filename.split(".")[-1] == "json":
+            data[0] = [
+                [name, hashes.to_dict()]
+                if isinstance(
+                    hashes, (fingerprinter.PackedHashes, fingerprinter.StoredHashes)
+                )
+                else [name, hashes]
+                for name, hashes in self.fingerprinted_files
+            ]
             with open(filename, "w") as f:
                 json.dump(data, f)
+        elif filename.split(".")[-1] == fingerprint_db.EXTENSION:
+            fingerprint_db.write_database(
+                filename, list(self.fingerprinted_files), self.config
+            )
+        elif filename.split(".")[-1] == fingerprint_library.EXTENSION:
+            fingerprint_library.FingerprintLibrary(filename).update(
+                list(self.fingerprinted_files), self.config
+            )
         else:
-            print("File type must be either pickle or json")
+            print("File type must be either pickle, json, fpdb, or fplib")
 
     def load_fingerprinted_files(self, filename: str) -> None:
         """
-        Loads/adds saved json or pickle file into current audalign object
+        Loads/adds saved json, pickle, or fpdb file, or fplib directory into current audalign object
+
+        Hash dicts are packed if config.hash_format is "packed". fpdb files are memory
+        mapped, their fingerprints stay on disk as StoredHashes that recognition searches
+        in place, so libraries larger than memory can be loaded. The fpdb file must not
+        be deleted while it's loaded. fplib directories are loaded the same way
 
         Args
         ----
-            filename (str): must be either json or pickle extension
+            filename (str): must be either json, pickle, fpdb, or fplib extension
 
         Returns
         -------
@@ -413,13 +483,24 @@ class FingerprintRecognizer(BaseRecognizer):
             elif filename.split(".")[-1] == "json":
                 with open(filename, "r") as f:
                     data = json.load(f)
+            elif filename.split(".")[-1] == fingerprint_db.EXTENSION:
+                data = [fingerprint_db.FingerprintDatabase(filename).stored_files()]
+            elif filename.split(".")[-1] == fingerprint_library.EXTENSION:
+                if not os.path.isdir(filename):
+                    raise FileNotFoundError(filename)
+                data = [fingerprint_library.FingerprintLibrary(filename).stored_files()]
             else:
-                print("File type must be either pickle or json")
+                print("File type must be either pickle, json, fpdb, or fplib")
                 return
-            self.fingerprinted_files.extend(data[0])
-            self.total_fingerprints += data[1]
-            self.file_names.extend(data[2])
-            self.filter_duplicates()
+            if self.config.hash_format == "packed":
+                data[0] = [
+                    [name, hashes]
+                    if isinstance(hashes, fingerprinter.StoredHashes)
+                    else [name, fingerprinter.pack_hashes(hashes)]
+                    for name, hashes in data[0]
+                ]
+            for name, hashes in data[0]:
+                self._add_file(name, hashes)
         except FileNotFoundError:
             print(f'"{filename}" not found')
 
@@ -435,31 +516,100 @@ class FingerprintRecognizer(BaseRecognizer):
         Returns:
             [tup]: filename, fingerprinted_files entry
         """
-        i = 0
-        while i < len(self.file_names):
-            if self.file_names[i] == filename:
-                self.total_fingerprints -= len(self.fingerprinted_files[i][1])
-                return self.file_names.pop(i), self.fingerprinted_files.pop(i)
-            i += 1
-        raise KeyError
+        hashes = self._files.pop(filename)
+        self._names_list = None
+        self.total_fingerprints -= len(hashes)
+        if filename in self._hash_index:
+            self._hash_index.remove(filename)
+        if self._shards is not None and filename in self._shards:
+            self._shards.remove(filename)
+        return filename, [filename, hashes]
 
     def add_filename(self, filename: str, file_fingerprints: list):
-        if filename not in self.file_names:
-            self.file_names.append(filename)
-            self.fingerprinted_files.append(file_fingerprints)
-            self.total_fingerprints += len(file_fingerprints[1])
+        self._add_file(filename, file_fingerprints[1])
+
+    def _add_file(self, file_name: str, hashes) -> None:
+        """Adds hashes to fingerprinted files, if not already fingerprinted
+
+        The hash index is brought up to date by the next recognition
+        """
+        if file_name not in self._files:
+            self._files[file_name] = hashes
+            self._names_list = None
+            self.total_fingerprints += len(hashes)
+            if self._shards is not None:
+                self._shards.add(file_name, hashes)
+
+    def _replace_file(self, old_name: str, file_name: str, hashes) -> None:
+        """Replaces the file old_name with file_name and hashes, in the same position
+
+        Raises:
+            ValueError: if file_name is another fingerprinted file
+        """
+        if file_name != old_name and file_name in self._files:
+            raise ValueError(f'"{file_name}" is already fingerprinted')
+        files = [
+            (file_name, hashes) if name == old_name else (name, old_hashes)
+            for name, old_hashes in self._files.items()
+        ]
+        self.total_fingerprints += len(hashes) - len(self._files[old_name])
+        self._files.clear()
+        self._files.update(files)
+        self._names_list = None
+        if old_name in self._hash_index:
+            self._hash_index.remove(old_name)
+        # shards order results by when files were added, started again when needed
+        self.close_recognition_shards()
+
+    def _names(self) -> list:
+        """Names of fingerprinted files as a list, for indexing the views"""
+        if self._names_list is None:
+            self._names_list = list(self._files)
+        return self._names_list
+
+    def _recognition_shards(self):
+        """Returns the sharded hash index if config.recognition_shards is more than 1"""
+        num_shards = self.config.recognition_shards
+        if num_shards is None or num_shards <= 1:
+            self.close_recognition_shards()
+            return None
+        if self._shards is not None and (
+            self._shards.num_shards != num_shards
+            or len(self._shards) != len(self._files)
+        ):
+            self.close_recognition_shards()
+        if self._shards is None:
+            self._shards = ShardedHashIndex(list(self._files.items()), num_shards)
+        return self._shards
+
+    def close_recognition_shards(self) -> None:
+        """
+        Stops the worker processes used for recognition with config.recognition_shards
+
+        They're started again by the next recognition
+        """
+        if self._shards is not None:
+            self._shards.close()
+            self._shards = None
+
+    def sync_hash_index(self) -> None:
+        """
+        Brings the hash index used for matching up to date with fingerprinted_files
+
+        Recognition calls it, so files are only packed into the index once they're
+        recognized against, rather than copied as soon as they're fingerprinted
+        """
+        for name in self._hash_index.names():
+            if name not in self._files:
+                self._hash_index.remove(name)
+        for name, hashes in self._files.items():
+            self._hash_index.add(name, hashes)
 
     def filter_duplicates(self) -> None:
         """
         Removes copies of fingerprinted files with the same name
+
+        Fingerprinted files are keyed by name, so copies are never added. Recounts
+        total_fingerprints in case it was modified directly
         """
-        name_checker = set()
-        i = 0
-        while i < len(self.file_names):
-            if self.file_names[i] in name_checker:
-                self.total_fingerprints -= len(self.fingerprinted_files[i][1])
-                self.fingerprinted_files.pop(i)
-                self.file_names.pop(i)
-            else:
-                name_checker.add(self.file_names[i])
-                i += 1
+        self.total_fingerprints = sum(len(hashes) for hashes in self._files.values())
@@ -0,0 +1,140 @@
+from collections.abc import Sequence
+
+
+class _RegistryView(Sequence):
+    """
+    Sequence view of a recognizer's dict of file name -> hashes, in the order files
+    were added
+
+    Files are added and removed through the recognizer, so its total_fingerprints,
+    hash index and recognition shards stay up to date. Indexing uses the recognizer's
+    list of names, which is only rebuilt after files are added or removed.
+    """
+
+    def __init__(self, recognizer):
+        self._recognizer = recognizer
+
+    def __len__(self):
+        return len(self._recognizer._files)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._item(name) for name in self._recognizer._names()[index]]
+        return self._item(self._name_at(index))
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            names = self._recognizer._names()[index]
+        else:
+            names = [self._name_at(index)]
+        for name in names:
+            self._recognizer.pop_filename(name)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, _RegistryView)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __reduce__(self):
+        # pickled as a list, rather than with the whole recognizer
+        return list, (list(self),)
+
+    def pop(self, index: int = -1):
+        """Removes the file at index from fingerprinted files and returns its item"""
+        if len(self) == 0:
+            raise IndexError(f"pop from empty {type(self).__name__}")
+        item = self[index]
+        del self[index]
+        return item
+
+    def clear(self) -> None:
+        """Removes every fingerprinted file"""
+        self._recognizer.clear_fingerprints()
+
+    def _name_at(self, index: int) -> str:
+        names = self._recognizer._names()
+        try:
+            return names[index]
+        except IndexError:
+            raise IndexError(f"{type(self).__name__} index out of range") from None
+
+    def _item(self, name: str):
+        raise NotImplementedError
+
+
+class FileNamesView(_RegistryView):
+    """
+    Names of fingerprinted files, in the form of a list
+
+    "in" is a dict lookup. Files can only be added with their fingerprints, so
+    appending names that aren't fingerprinted raises ValueError. Removing a name
+    removes its file, and setting a name renames its file.
+    """
+
+    def __iter__(self):
+        return iter(self._recognizer._files)
+
+    def __contains__(self, name):
+        return name in self._recognizer._files
+
+    def __setitem__(self, index: int, name: str):
+        old_name = self._name_at(index)
+        self._recognizer._replace_file(
+            old_name, name, self._recognizer._files[old_name]
+        )
+
+    def _item(self, name: str):
+        return name
+
+    def append(self, name: str) -> None:
+        if name not in self._recognizer._files:
+            raise ValueError(
+                f'"{name}" has no fingerprints, add it with fingerprinted_files or add_filename'
+            )
+
+    def extend(self, names) -> None:
+        for name in list(names):
+            self.append(name)
+
+    def remove(self, name: str) -> None:
+        """Removes the file named name from fingerprinted files"""
+        if name not in self._recognizer._files:
+            raise ValueError(f'"{name}" is not fingerprinted')
+        self._recognizer.pop_filename(name)
+
+
+class FingerprintedFilesView(_RegistryView):
+    """
+    [name, hashes] of fingerprinted files, in the form of a list
+
+    Appended files that are already fingerprinted are ignored. Setting an item
+    replaces the name and hashes of the file at that index.
+    """
+
+    def __iter__(self):
+        return ([name, hashes] for name, hashes in self._recognizer._files.items())
+
+    def __setitem__(self, index: int, file_fingerprints: list):
+        name, hashes = file_fingerprints
+        self._recognizer._replace_file(self._name_at(index), name, hashes)
+
+    def _item(self, name: str):
+        return [name, self._recognizer._files[name]]
+
+    def append(self, file_fingerprints: list) -> None:
+        name, hashes = file_fingerprints
+        self._recognizer._add_file(name, hashes)
+
+    def extend(self, files) -> None:
+        for file_fingerprints in list(files):
+            self.append(file_fingerprints)
+
+    def remove(self, file_fingerprints: list) -> None:
+        """Removes the file named file_fingerprints[0] from fingerprinted files"""
+        name = file_fingerprints[0]
+        if name not in self._recognizer._files:
+            raise ValueError(f'"{name}" is not fingerprinted')
+        self._recognizer.pop_filename(name)
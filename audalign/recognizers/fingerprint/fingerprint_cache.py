@@ -0,0 +1,145 @@
+import hashlib
+import os
+import pickle
+
+from audalign.config.fingerprint import FingerprintConfig
+import audalign.recognizers.fingerprint.fingerprinter as fingerprinter
+
+# part of every cache key, increment when the hashes of a file and settings change
+CACHE_VERSION = 1
+# eviction removes entries until the cache is this fraction of max_size, so a full
+# cache isn't listed again on every put
+EVICT_FRACTION = 0.9
+
+
+class FingerprintCache:
+    """
+    On disk cache of fingerprinted files
+
+    Each entry is a pickle of one file's hashes, named by a digest of the file's path,
+    size and modification time, of every config setting that changes fingerprints, and
+    of CACHE_VERSION. Modified files, changed settings and new versions miss the cache,
+    their old entries are evicted eventually. Entries are touched when read. The cache's
+    size is listed once and then kept as entries are put, and once it's larger than
+    max_size bytes the least recently used entries are removed.
+
+    Args
+        cache_dir (str): directory of the cache, created if it doesn't exist
+        max_size (int): max total size of cache entries in bytes
+    """
+
+    def __init__(self, cache_dir: str, max_size: int):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._size = None  # total size of entries, listed on first put
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, file_path: str, config: FingerprintConfig):
+        """Returns the cached hashes of file_path, or None if they aren't cached"""
+        entry = self._entry_path(file_path, config)
+        if entry is None:
+            return None
+        try:
+            with open(entry, "rb") as f:
+                hashes = pickle.load(f)
+            os.utime(entry)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return hashes
+
+    def put(self, file_path: str, config: FingerprintConfig, hashes) -> None:
+        """Caches the hashes of file_path, evicting old entries if the cache is too large"""
+        entry = self._entry_path(file_path, config)
+        if entry is None or hashes is None:
+            return
+        if self._size is None:
+            self._size = sum(x[1] for x in self._entries())
+        temp_entry = f"{entry}.{os.getpid()}.tmp"
+        with open(temp_entry, "wb") as f:
+            pickle.dump(hashes, f)
+        try:
+            self._size -= os.stat(entry).st_size
+        except FileNotFoundError:
+            pass
+        self._size += os.stat(temp_entry).st_size
+        os.replace(temp_entry, entry)
+        if self._size > self.max_size:
+            self.evict(int(self.max_size * EVICT_FRACTION))
+
+    def evict(self, max_size: int = None) -> None:
+        """Removes least recently used entries until the cache fits in max_size
+
+        Args
+            max_size (int, optional): size to fit in, defaults to the cache's max_size
+        """
+        if max_size is None:
+            max_size = self.max_size
+        entries = self._entries()
+        total_size = sum(x[1] for x in entries)
+        for _, size, name in sorted(entries):
+            if total_size <= max_size:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total_size -= size
+        self._size = total_size
+
+    def clear(self) -> None:
+        """Removes every entry in the cache"""
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".pickle"):
+                os.remove(os.path.join(self.cache_dir, name))
+        self._size = 0
+
+    def _entries(self) -> list:
+        """(modification time, size, name) of every entry"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pickle"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def _entry_path(self, file_path: str, config: FingerprintConfig):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        key = repr(
+            (
+                CACHE_VERSION,
+                os.path.abspath(file_path),
+                stat.st_size,
+                stat.st_mtime_ns,
+                sorted(config.get_fingerprint_settings().items()),
+            )
+        )
+        return os.path.join(
+            self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pickle"
+        )
+
+
+def _cached_fingerprint_worker(
+    file_path: str, config: FingerprintConfig, cache: FingerprintCache = None
+) -> tuple:
+    """
+    fingerprinter._fingerprint_worker that reads the hashes of file_path from cache if
+    they're cached. New hashes aren't put in the cache, so the process that owns the
+    cache can keep track of its size
+
+    Returns
+    -------
+        file_name, hashes, and whether hashes came from the cache
+    """
+    if cache is not None:
+        hashes = cache.get(file_path, config)
+        if hashes is not None:
+            return os.path.basename(file_path), hashes, True
+    file_name, hashes = fingerprinter._fingerprint_worker(file_path, config=config)
+    return file_name, hashes, False
@@ -0,0 +1,260 @@
+import json
+import os
+import pickle
+import struct
+
+import numpy as np
+
+import audalign.recognizers.fingerprint.fingerprinter as fingerprinter
+from audalign.config.fingerprint import FingerprintConfig
+from audalign.recognizers.fingerprint.hash_index import find_segment_matches
+
+MAGIC = b"AUDALIGNFPDB"
+VERSION = 1
+EXTENSION = "fpdb"
+_ALIGNMENT = 64
+# magic, uint32 version, uint64 header length
+_PREAMBLE = struct.Struct(f"<{len(MAGIC)}sIQ")
+_COLUMNS = {
+    "hashes": np.uint64,
+    "file_ids": np.int32,
+    "offsets": np.int32,
+    "file_rows": np.int64,
+}
+
+
+def write_database(
+    filename: str, fingerprinted_files: list, config: FingerprintConfig = None
+) -> None:
+    """
+    Writes fingerprinted files to a columnar fingerprint database
+
+    The file is a small json header followed by flat little endian arrays. "hashes",
+    "file_ids" and "offsets" hold every fingerprint of every file, sorted by hash.
+    "file_rows" holds the rows of each file in hash order, one block per file. The
+    header holds the file table, the settings of config, and the position of each
+    array, which are aligned to 64 bytes so they can be memory mapped.
+
+    Hash dicts are packed, so sha1 hashes are stored by their first 16 hex characters.
+
+    Args
+    ----
+        filename (str): database file to write
+        fingerprinted_files (list[[str, dict or PackedHashes]]): file names and hashes
+        config (FingerprintConfig): settings stored in the header
+    """
+    files = []
+    for name, hashes in fingerprinted_files:
+        if hashes is not None:
+            files.append([name, fingerprinter.pack_hashes(hashes)])
+
+    if len(files) > 0:
+        hashes = np.concatenate([x[1].hashes for x in files])
+        offsets = np.concatenate([x[1].offsets for x in files])
+        file_ids = np.repeat(
+            np.arange(len(files), dtype=np.int32), [len(x[1].hashes) for x in files]
+        )
+    else:
+        hashes = np.zeros(0, dtype=np.uint64)
+        offsets = np.zeros(0, dtype=np.int32)
+        file_ids = np.zeros(0, dtype=np.int32)
+    order = np.argsort(hashes, kind="stable")
+    columns = {
+        "hashes": hashes[order],
+        "file_ids": file_ids[order],
+        "offsets": offsets[order],
+    }
+    columns["file_rows"] = np.argsort(columns["file_ids"], kind="stable")
+
+    file_table = []
+    row = 0
+    for name, packed in files:
+        file_table.append(
+            {
+                "name": name,
+                "row": row,
+                "num_rows": len(packed.hashes),
+                "num_hashes": len(packed),
+            }
+        )
+        row += len(packed.hashes)
+
+    array_table = {}
+    position = 0
+    for column, dtype in _COLUMNS.items():
+        array_table[column] = {"offset": position, "count": len(columns[column])}
+        position = _aligned(position + len(columns[column]) * np.dtype(dtype).itemsize)
+
+    header = json.dumps(
+        {
+            "files": file_table,
+            "arrays": array_table,
+            "config": config.get_fingerprint_settings() if config is not None else {},
+        }
+    ).encode("utf-8")
+    data_start = _aligned(_PREAMBLE.size + len(header))
+
+    temp_filename = f"{filename}.{os.getpid()}.tmp"
+    with open(temp_filename, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for column, dtype in _COLUMNS.items():
+            f.write(b"\0" * (data_start + array_table[column]["offset"] - f.tell()))
+            f.write(columns[column].astype(np.dtype(dtype).newbyteorder("<")).tobytes())
+    os.replace(temp_filename, filename)
+
+
+def read_header(filename: str):
+    """
+    Reads the header of a fingerprint database
+
+    Args
+    ----
+        filename (str): database file
+
+    Returns
+    -------
+        header, data_start (dict, int): json header and the byte position of the first array
+
+    Raises:
+        ValueError: if filename isn't a fingerprint database of a supported version
+    """
+    with open(filename, "rb") as f:
+        preamble = f.read(_PREAMBLE.size)
+        if len(preamble) < _PREAMBLE.size or not preamble.startswith(MAGIC):
+            raise ValueError(f'"{filename}" is not a fingerprint database')
+        _, version, header_length = _PREAMBLE.unpack(preamble)
+        if version != VERSION:
+            raise ValueError(
+                f'"{filename}" is fingerprint database version {version}, expected {VERSION}'
+            )
+        header = json.loads(f.read(header_length).decode("utf-8"))
+    return header, _aligned(_PREAMBLE.size + header_length)
+
+
+class FingerprintDatabase:
+    """
+    Read only view of a fingerprint database written by write_database
+
+    The arrays are memory mapped rather than read, so opening a database only reads
+    its header, and find_matches only touches the pages holding the target's hashes.
+    segment holds the hash, file id and offset arrays in the form of a hash index
+    segment. Pickling a database pickles its filename, it's reopened when unpickled.
+
+    Args
+    ----
+        filename (str): database file
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        header, data_start = read_header(filename)
+        self.config = header["config"]
+        self._files = header["files"]
+        self._file_ids = {x["name"]: i for i, x in enumerate(self._files)}
+        self.total_fingerprints = sum(x["num_hashes"] for x in self._files)
+
+        buffer = np.memmap(filename, dtype=np.uint8, mode="r")
+        self._columns = {}
+        for column, dtype in _COLUMNS.items():
+            dtype = np.dtype(dtype).newbyteorder("<")
+            start = data_start + header["arrays"][column]["offset"]
+            end = start + header["arrays"][column]["count"] * dtype.itemsize
+            self._columns[column] = buffer[start:end].view(dtype)
+        self.segment = [
+            self._columns["hashes"],
+            self._columns["file_ids"],
+            self._columns["offsets"],
+        ]
+
+    def __reduce__(self):
+        return (FingerprintDatabase, (self.filename,))
+
+    def __len__(self):
+        return len(self._files)
+
+    def __contains__(self, name: str):
+        return name in self._file_ids
+
+    def names(self) -> list:
+        return [x["name"] for x in self._files]
+
+    def name(self, file_id: int) -> str:
+        return self._files[file_id]["name"]
+
+    def file_id(self, name: str) -> int:
+        return self._file_ids[name]
+
+    def packed(self, name: str):
+        """Reads the fingerprints of one file as PackedHashes
+
+        Raises:
+            KeyError: if name is not in the database
+        """
+        file_info = self._files[self._file_ids[name]]
+        rows = self._columns["file_rows"][
+            file_info["row"] : file_info["row"] + file_info["num_rows"]
+        ]
+        return fingerprinter.PackedHashes(
+            np.asarray(self._columns["hashes"][rows], dtype=np.uint64),
+            np.asarray(self._columns["offsets"][rows], dtype=np.int32),
+            is_sorted=True,
+        )
+
+    def fingerprinted_files(self) -> list:
+        """Reads every file's fingerprints, in the form of FingerprintRecognizer.fingerprinted_files"""
+        return [[x["name"], self.packed(x["name"])] for x in self._files]
+
+    def stored_files(self) -> list:
+        """Every file's fingerprints as StoredHashes, which are read from disk only when packed"""
+        return [
+            [x["name"], fingerprinter.StoredHashes(self, x["name"], x["num_hashes"])]
+            for x in self._files
+        ]
+
+    def find_matches(self, target, exclude_names: list = ()):
+        """
+        Finds every occurence of the target's hashes in the database
+
+        Args
+            target (dict or PackedHashes): hashes of target file
+            exclude_names (list[str]): file names to leave out of the matches
+
+        Returns
+        -------
+            file_ids, t_offsets, a_offsets (array[int], array[int], array[int]): file id,
+            target offset, and against offset of each matching pair of fingerprints,
+            ordered by file id
+        """
+        exclude_ids = [
+            self._file_ids[name] for name in exclude_names if name in self._file_ids
+        ]
+        return find_segment_matches([self.segment], target, exclude_ids)
+
+
+def convert_fingerprints_file(
+    fingerprints_file: str, database_file: str, config: FingerprintConfig = None
+) -> None:
+    """
+    Converts fingerprints saved to json or pickle by save_fingerprinted_files
+    to a fingerprint database
+
+    Args
+    ----
+        fingerprints_file (str): json or pickle file to convert
+        database_file (str): fingerprint database to write
+        config (FingerprintConfig): settings stored in the header
+    """
+    if fingerprints_file.split(".")[-1] == "pickle":
+        with open(fingerprints_file, "rb") as f:
+            data = pickle.load(f)
+    elif fingerprints_file.split(".")[-1] == "json":
+        with open(fingerprints_file, "r") as f:
+            data = json.load(f)
+    else:
+        raise ValueError(f'"{fingerprints_file}" must be either pickle or json')
+    write_database(database_file, data[0], config)
+
+
+def _aligned(position: int) -> int:
+    return -(-position // _ALIGNMENT) * _ALIGNMENT
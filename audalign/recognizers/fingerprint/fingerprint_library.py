@@ -0,0 +1,215 @@
+import json
+import os
+
+import audalign.recognizers.fingerprint.fingerprinter as fingerprinter
+import audalign.recognizers.fingerprint.fingerprint_db as fingerprint_db
+from audalign.config.fingerprint import FingerprintConfig
+
+EXTENSION = "fplib"
+MANIFEST = "manifest.json"
+
+
+class FingerprintLibrary:
+    """
+    Directory of append-only fingerprint database segments
+
+    Added files are written to a new segment, removed files are marked as removed in
+    the manifest of their segment, so updates cost proportional to the changed files
+    rather than the whole library. compact merges every segment into one without the
+    removed files.
+
+    The manifest is replaced atomically after segments are written, and replaced
+    segments are only deleted after, so readers always see a complete library.
+    Segments that can't be deleted yet, like segments still memory mapped by loaded
+    files on Windows, are deleted when the library is opened or compacted again.
+
+    Args
+    ----
+        path (str): library directory, created if it doesn't exist
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._databases = {}  # segment file -> FingerprintDatabase
+        manifest_path = os.path.join(path, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+        else:
+            manifest = {"next_segment": 0, "segments": []}
+        self._next_segment = manifest["next_segment"]
+        # [{"file": segment file, "removed": [names]}], oldest first
+        self._segments = manifest["segments"]
+        self._locations = {}  # name -> position in _segments of its live copy
+        for position, segment in enumerate(self._segments):
+            removed = set(segment["removed"])
+            for name in self._database(segment["file"]).names():
+                if name not in removed:
+                    self._locations[name] = position
+        self._remove_unused_segments()
+
+    def __len__(self):
+        return len(self._locations)
+
+    def __contains__(self, name: str):
+        return name in self._locations
+
+    def names(self) -> list:
+        return list(self._locations.keys())
+
+    def num_segments(self) -> int:
+        return len(self._segments)
+
+    def stored_files(self) -> list:
+        """Every live file's fingerprints as StoredHashes, which are read from disk only when packed"""
+        stored_files = []
+        for position, segment in enumerate(self._segments):
+            for name, hashes in self._database(segment["file"]).stored_files():
+                if self._locations.get(name) == position:
+                    stored_files.append([name, hashes])
+        return stored_files
+
+    def append(
+        self, fingerprinted_files: list, config: FingerprintConfig = None
+    ) -> None:
+        """
+        Writes files to a new segment, replacing live copies with the same names
+
+        Args
+        ----
+            fingerprinted_files (list[[str, hashes]]): file names and hashes
+            config (FingerprintConfig): settings stored in the segment header
+        """
+        fingerprinted_files = [x for x in fingerprinted_files if x[1] is not None]
+        if len(fingerprinted_files) == 0:
+            return
+        segment_file = _segment_file(self._next_segment)
+        fingerprint_db.write_database(
+            os.path.join(self.path, segment_file), fingerprinted_files, config
+        )
+        self._next_segment += 1
+        self._mark_removed([name for name, _ in fingerprinted_files])
+        self._segments.append({"file": segment_file, "removed": []})
+        for name, _ in fingerprinted_files:
+            self._locations[name] = len(self._segments) - 1
+        self._write_manifest()
+
+    def remove(self, names: list) -> None:
+        """Marks files as removed, names not in the library are ignored"""
+        self._mark_removed(names)
+        self._write_manifest()
+
+    def update(
+        self, fingerprinted_files: list, config: FingerprintConfig = None
+    ) -> None:
+        """
+        Updates the library to hold exactly fingerprinted_files
+
+        Files already stored in the library are left as they are, other files are
+        appended as a new segment, and files missing from fingerprinted_files are
+        marked as removed.
+
+        Args
+        ----
+            fingerprinted_files (list[[str, hashes]]): file names and hashes
+            config (FingerprintConfig): settings stored in the segment header
+        """
+        new_files, keep_names = [], set()
+        for name, hashes in fingerprinted_files:
+            keep_names.add(name)
+            if not self._is_stored(name, hashes):
+                new_files.append([name, hashes])
+        self._mark_removed([name for name in self._locations if name not in keep_names])
+        self.append(new_files, config)
+        self._write_manifest()
+
+    def compact(self, config: FingerprintConfig = None) -> None:
+        """
+        Merges every segment into one without removed files
+
+        Reads every live file into memory to write the merged segment
+
+        Args
+        ----
+            config (FingerprintConfig): settings stored in the segment header
+        """
+        old_segments = [segment["file"] for segment in self._segments]
+        live_files = [
+            [name, fingerprinter.pack_hashes(hashes)]
+            for name, hashes in self.stored_files()
+        ]
+        self._segments = []
+        self._locations = {}
+        self.append(live_files, config)
+        self._write_manifest()
+        for segment_file in old_segments:
+            self._databases.pop(segment_file, None)
+        self._remove_unused_segments()
+
+    def _is_stored(self, name: str, hashes) -> bool:
+        """True if hashes are the live copy of name in this library"""
+        if name not in self._locations or not isinstance(
+            hashes, fingerprinter.StoredHashes
+        ):
+            return False
+        segment_file = self._segments[self._locations[name]]["file"]
+        return os.path.abspath(hashes.database.filename) == os.path.abspath(
+            os.path.join(self.path, segment_file)
+        )
+
+    def _mark_removed(self, names: list) -> None:
+        for name in names:
+            position = self._locations.pop(name, None)
+            if position is not None:
+                self._segments[position]["removed"].append(name)
+
+    def _remove_unused_segments(self) -> None:
+        """
+        Deletes segment files that aren't in the manifest, if they can be deleted
+
+        Only segments numbered below next_segment are deleted, later segments may be
+        being written by another library before it replaces the manifest
+        """
+        live_segments = {segment["file"] for segment in self._segments}
+        for segment_file in os.listdir(self.path):
+            number = _segment_number(segment_file)
+            if (
+                number is None
+                or number >= self._next_segment
+                or segment_file in live_segments
+            ):
+                continue
+            try:
+                os.remove(os.path.join(self.path, segment_file))
+            except OSError:
+                pass
+
+    def _database(self, segment_file: str):
+        if segment_file not in self._databases:
+            self._databases[segment_file] = fingerprint_db.FingerprintDatabase(
+                os.path.join(self.path, segment_file)
+            )
+        return self._databases[segment_file]
+
+    def _write_manifest(self) -> None:
+        manifest_path = os.path.join(self.path, MANIFEST)
+        temp_path = f"{manifest_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(
+                {"next_segment": self._next_segment, "segments": self._segments}, f
+            )
+        os.replace(temp_path, manifest_path)
+
+
+def _segment_file(number: int) -> str:
+    return f"segment-{number:06d}.{fingerprint_db.EXTENSION}"
+
+
+def _segment_number(segment_file: str):
+    """Number of a segment file name, None if it isn't one"""
+    prefix, suffix = "segment-", f".{fingerprint_db.EXTENSION}"
+    if not segment_file.startswith(prefix) or not segment_file.endswith(suffix):
+        return None
+    number = segment_file[len(prefix) : -len(suffix)]
+    return int(number) if number.isdigit() else None
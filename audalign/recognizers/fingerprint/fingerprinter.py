@@ -1,8 +1,7 @@
 import hashlib
 
-import matplotlib.mlab as mlab
-import matplotlib.pyplot as plt
 import numpy as np
+import scipy.fft
 from audalign.config.fingerprint import FingerprintConfig
 from pydub.exceptions import CouldntDecodeError
 from scipy.ndimage import (
@@ -10,6 +9,7 @@ from scipy.ndimage import (
     generate_binary_structure,
     iterate_structure,
     maximum_filter,
+    minimum_filter,
 )
 
 np.seterr(divide="ignore")
@@ -69,10 +69,21 @@ def _fingerprint_worker(
         )
 
     print(f"Fingerprinting {file_name}")
-    hashes = fingerprint(
-        channel,
-        config=config,
-    )
+    if (
+        config.streaming_min_duration is not None
+        and config.peak_sort
+        and not config.plot
+        and len(channel) > config.streaming_min_duration * config.sample_rate
+    ):
+        hashes = fingerprint_streaming(
+            channel,
+            config=config,
+        )
+    else:
+        hashes = fingerprint(
+            channel,
+            config=config,
+        )
 
     print(f"Finished fingerprinting {file_name}")
 
@@ -95,39 +106,10 @@ def fingerprint(
 
     Returns
     -------
-        hashes (dict{str: [int]}): hashes of the form dict{hash: location}
+        hashes (dict{str: [int]} or PackedHashes): hashes of the form dict{hash: location}
+        or PackedHashes if config.hash_format is "packed"
     """
-    # FFT the signal and extract frequency components
-    # To get the frequencies of each row, get the second returned component
-    arr2D, frequencies, _ = mlab.specgram(
-        channel_samples,
-        NFFT=config.fft_window_size,
-        Fs=config.sample_rate,
-        window=mlab.window_hanning,
-        noverlap=int(config.fft_window_size * config.DEFAULT_OVERLAP_RATIO),
-    )
-    # )[0]
-
-    # apply log transform since specgram() returns linear array
-    # print(arr2D)
-    # print(max(arr2D[0]))
-    arr2D = 10 * np.log2(arr2D)
-    # got better results with a log2, but this means that nothing is in terms of decibels
-    # arr2D = 10 * np.log10(arr2D, out=np.zeros_like(arr2D), where=(arr2D != 0))
-    arr2D[arr2D == -np.inf] = 0  # replace infs with zeros
-    # print(max(arr2D[0]))
-    # print(f"length of arr2d {len(arr2D)}")
-    # print(f"length of arr2d height {len(arr2D[1])}")
-
-    if config.freq_threshold is not None:
-        index = 0
-        for i, frequency in enumerate(frequencies):
-            if frequency > config.freq_threshold - 0.0001:
-                index = i
-                break
-        else:
-            index = len(frequencies)
-        arr2D[0:index] = 0
+    arr2D = _spectrogram(channel_samples, config)
 
     if retspec:
         return arr2D
@@ -142,49 +124,202 @@ def fingerprint(
     )
 
 
+def fingerprint_streaming(
+    channel_samples,
+    config: FingerprintConfig,
+):
+    """
+    Fingerprints the channel in blocks of config.streaming_block_size seconds, so the
+    spectrogram of the whole channel is never held in memory. Gives the same hashes as
+    fingerprint if config.peak_sort is set.
+
+    Args
+        channel_samples (array[int]): audio file data
+        config (FingerprintConfig): fingerprint config
+
+    Returns
+    -------
+        hashes (dict{str: [int]} or PackedHashes): hashes of the form dict{hash: location}
+        or PackedHashes if config.hash_format is "packed"
+    """
+    hash_dict = {}
+    hash_list, offset_list = [], []
+    for hashes in fingerprint_blocks(channel_samples, config):
+        if hashes is None:
+            return None
+        if isinstance(hashes, PackedHashes):
+            hash_list.append(hashes.hashes)
+            offset_list.append(hashes.offsets)
+            continue
+        for h, offsets in hashes.items():
+            if h not in hash_dict:
+                hash_dict[h] = offsets
+            else:
+                hash_dict[h] += offsets
+
+    if config.hash_format == "packed":
+        if len(hash_list) == 0:
+            return PackedHashes(np.zeros(0, dtype=np.uint64), np.zeros(0))
+        return PackedHashes(np.concatenate(hash_list), np.concatenate(offset_list))
+    return hash_dict
+
+
+def fingerprint_blocks(
+    channel_samples,
+    config: FingerprintConfig,
+):
+    """
+    Yields the hashes of the channel one block of config.streaming_block_size seconds at
+    a time.
+
+    Each block's spectrogram has peak_neighborhood_size extra frames on both sides, so
+    peaks found near the edges of blocks are the same as for the whole spectrogram. The
+    last default_fan_value - 1 peaks of each block are carried over to the next block
+    to be hashed with its peaks.
+
+    Args
+        channel_samples (array[int]): audio file data
+        config (FingerprintConfig): fingerprint config
+
+    Yields
+    ------
+        hashes (dict{str: [int]} or PackedHashes): hashes of the block
+    """
+    noverlap = int(config.fft_window_size * config.DEFAULT_OVERLAP_RATIO)
+    step = config.fft_window_size - noverlap
+    num_frames = max((len(channel_samples) - noverlap) // step, 1)
+    block_frames = max(int(config.streaming_block_size * config.sample_rate / step), 1)
+    context = config.peak_neighborhood_size
+
+    carry = (
+        np.zeros(0, dtype=np.int64),
+        np.zeros(0, dtype=np.int64),
+        np.zeros(0, dtype=np.float64),
+    )
+    for block_start in range(0, num_frames, block_frames):
+        block_end = min(block_start + block_frames, num_frames)
+        context_start = max(block_start - context, 0)
+        context_end = min(block_end + context, num_frames)
+        arr2D = _spectrogram(
+            channel_samples[
+                context_start * step : (context_end - 1) * step + config.fft_window_size
+            ],
+            config,
+        )
+        frequency_idx, time_idx, amps = get_2D_peaks(arr2D, config=config)
+
+        in_block = (time_idx >= block_start - context_start) & (
+            time_idx < block_end - context_start
+        )
+        peaks = (
+            np.concatenate([carry[0], frequency_idx[in_block]]),
+            np.concatenate([carry[1], time_idx[in_block] + context_start]),
+            np.concatenate([carry[2], amps[in_block]]),
+        )
+
+        # peaks without all of their fan window in this block wait for the next block
+        if block_end == num_frames:
+            num_anchors = len(peaks[0])
+        else:
+            num_anchors = max(len(peaks[0]) - config.default_fan_value + 1, 0)
+        yield generate_hashes(peaks, config, num_anchors=num_anchors)
+        carry = tuple(x[num_anchors:] for x in peaks)
+
+
+def _spectrogram(channel_samples, config: FingerprintConfig):
+    """
+    float32 power spectral density of the channel in log2 scale, with frequencies below
+    config.freq_threshold zeroed. Same scaling as matplotlib.mlab.specgram with a hanning
+    window, shape (fft_window_size // 2 + 1, number of frames)
+    """
+    nfft = config.fft_window_size
+    step = nfft - int(nfft * config.DEFAULT_OVERLAP_RATIO)
+    samples = np.asarray(channel_samples, dtype=np.float32)
+    if len(samples) < nfft:
+        samples = np.concatenate([samples, np.zeros(nfft - len(samples), np.float32)])
+    frames = np.lib.stride_tricks.sliding_window_view(samples, nfft)[::step]
+    window = np.hanning(nfft)
+    frequencies = np.fft.rfftfreq(nfft, 1 / config.sample_rate)
+
+    # one sided psd, doubled everywhere but 0 and the nyquist frequency
+    scale = np.full(len(frequencies), 1 / (config.sample_rate * (window**2).sum()))
+    scale[1 : None if nfft % 2 else -1] *= 2
+    scale = scale.astype(np.float32)
+    window = window.astype(np.float32)
+
+    arr2D = np.empty((len(frequencies), len(frames)), dtype=np.float32)
+    chunk = max(_SPECTROGRAM_CHUNK_SIZE // nfft, 1)
+    for start in range(0, len(frames), chunk):
+        spectrum = scipy.fft.rfft(frames[start : start + chunk] * window, axis=1)
+        power = np.square(spectrum.real)
+        power += np.square(spectrum.imag)
+        power *= scale
+        arr2D[:, start : start + chunk] = power.T
+
+    # apply log transform since the psd is linear
+    # got better results with a log2, but this means that nothing is in terms of decibels
+    np.log2(arr2D, out=arr2D)
+    arr2D *= 10
+    arr2D[arr2D == -np.inf] = 0  # replace infs with zeros
+
+    if config.freq_threshold is not None:
+        index = np.searchsorted(
+            frequencies, config.freq_threshold - 0.0001, side="right"
+        )
+        arr2D[0:index] = 0
+
+    return arr2D
+
+
+# Rough number of samples windowed and transformed at once
+_SPECTROGRAM_CHUNK_SIZE = 2**22
+
+
 def get_2D_peaks(arr2D, config: FingerprintConfig):
-    #  http://docs.scipy.org/doc/scipy/reference/generated/scipy.ndimage.iterate_structure.html#scipy.ndimage.iterate_structure
-    struct = generate_binary_structure(
-        2, 1
-    )  # 2 is faster here for connectivity, mainly saves time in maximum filter function.
-    # 2 results in slightly less fingerprints (4/5?), which specifically could help with false detections in noise.
-    # It would also lessen fingerprints at edges of sound events.
-    # I think it's more important to keep those edges of sound events than worry about noise here or speed
-    neighborhood = iterate_structure(struct, config.peak_neighborhood_size)
-
-    # find local maxima using our filter shape
-    local_max = maximum_filter(arr2D, footprint=neighborhood) == arr2D
     background = arr2D == 0
-    eroded_background = binary_erosion(
-        background, structure=neighborhood, border_value=1
-    )
+    if config.peak_detection == "square":
+        # square filters are separable, so each axis is filtered on its own
+        size = 2 * config.peak_neighborhood_size + 1
+        local_max = maximum_filter(arr2D, size=size) == arr2D
+        eroded_background = minimum_filter(
+            background, size=size, mode="constant", cval=1
+        )
+    else:
+        #  http://docs.scipy.org/doc/scipy/reference/generated/scipy.ndimage.iterate_structure.html#scipy.ndimage.iterate_structure
+        struct = generate_binary_structure(
+            2, 1
+        )  # 2 is faster here for connectivity, mainly saves time in maximum filter function.
+        # 2 results in slightly less fingerprints (4/5?), which specifically could help with false detections in noise.
+        # It would also lessen fingerprints at edges of sound events.
+        # I think it's more important to keep those edges of sound events than worry about noise here or speed
+        neighborhood = iterate_structure(struct, config.peak_neighborhood_size)
+
+        # find local maxima using our filter shape
+        local_max = maximum_filter(arr2D, footprint=neighborhood) == arr2D
+        eroded_background = binary_erosion(
+            background, structure=neighborhood, border_value=1
+        )
 
     # Boolean mask of arr2D with True at peaks (Fixed deprecated boolean operator by changing '-' to '^')
     detected_peaks = local_max ^ eroded_background
 
     # extract peaks
-    amps = arr2D[detected_peaks]
-    j, i = np.where(detected_peaks)
+    frequency_idx, time_idx = np.nonzero(detected_peaks)
+    amps = arr2D[frequency_idx, time_idx]
 
     # filter peaks
-    amps = amps.flatten()
-    peaks = zip(i, j, amps)
-
     # This cuts off by frequency band rather than hertz
-    # peaks_filtered = filter(
-    #     lambda x: x[2] > config.default_amp_min and x[1] > config.freq_threshold, peaks
-    # )  # time, freq, amp
-    peaks_filtered = filter(
-        lambda x: x[2] > config.default_amp_min, peaks
-    )  # time, freq, amp
-    # get indices for frequency and time
-    frequency_idx = []
-    time_idx = []
-    for x in peaks_filtered:
-        frequency_idx.append(x[1])
-        time_idx.append(x[0])
+    # loud = (amps > config.default_amp_min) & (frequency_idx > config.freq_threshold)
+    loud = amps > config.default_amp_min
+    frequency_idx, time_idx, amps = frequency_idx[loud], time_idx[loud], amps[loud]
+
+    if config.peak_sort:
+        order = np.argsort(time_idx, kind="stable")
+        frequency_idx, time_idx, amps = frequency_idx[order], time_idx[order], amps[order]
 
     if config.plot:
+        import matplotlib.pyplot as plt
+
         # scatter of the peaks
         fig, ax = plt.subplots()
         ax.imshow(arr2D)
@@ -195,35 +330,58 @@ def get_2D_peaks(arr2D, config: FingerprintConfig):
         plt.gca().invert_yaxis()
         plt.show()
 
-    return zip(frequency_idx, time_idx)
+    return frequency_idx, time_idx, amps
 
 
-def generate_hashes(peaks, config: FingerprintConfig):
+def generate_hashes(peaks, config: FingerprintConfig, num_anchors: int = None):
     """
     Hash list structure:
        sha1_hash[0:30]    time_offset
     [(e05b341a9b77a51fd26..., 32), ... ]
+
+    Args
+        peaks (tuple(array[int], array[int], array[float])): frequency index, time index
+            and amplitude of each peak from get_2D_peaks, sorted if config.peak_sort
+        config (FingerprintConfig): fingerprint config
+        num_anchors (int): only hashes peak pairs/triples starting in the first num_anchors
+            peaks, hashes all if None
     """
-    peaks = list(peaks)
-    if config.peak_sort:
-        peaks = sorted(peaks, key=lambda x: x[1])
+    frequency_idx, time_idx = peaks[0], peaks[1]
+    if num_anchors is None:
+        num_anchors = len(frequency_idx)
+
+    if config.hash_engine == "numpy":
+        return numpy_hashes(
+            frequency_idx, time_idx, config=config, num_anchors=num_anchors
+        )
+
+    peaks = [None, None]
+    peaks[config._IDX_FREQ_I] = frequency_idx.tolist()
+    peaks[config._IDX_TIME_J] = time_idx.tolist()
+    peaks = list(zip(*peaks))
     # print("Length of Peaks List is: {}".format(len(peaks)))
 
     if config.hash_style == "panako_mod":
-        return panako_mod(peaks, config=config)
+        hashes = panako_mod(peaks, config=config, num_anchors=num_anchors)
     elif config.hash_style == "base":
-        return base(peaks, config=config)
+        hashes = base(peaks, config=config, num_anchors=num_anchors)
     elif config.hash_style == "panako":
-        return panako(peaks, config=config)
+        hashes = panako(peaks, config=config, num_anchors=num_anchors)
     elif config.hash_style == "base_three":
-        return base_three(peaks, config=config)
+        hashes = base_three(peaks, config=config, num_anchors=num_anchors)
     else:
         print(f'Hash style "{config.hash_style}" is not inplemented')
+        return None
+    if config.hash_format == "packed":
+        return PackedHashes.from_dict(hashes)
+    return hashes
 
 
-def panako_mod(peaks, config: FingerprintConfig):
+def panako_mod(peaks, config: FingerprintConfig, num_anchors: int = None):
     hash_dict = {}
-    for i in range(0, len(peaks), 1):
+    if num_anchors is None:
+        num_anchors = len(peaks)
+    for i in range(0, num_anchors, 1):
         freq1 = peaks[i][config._IDX_FREQ_I]
         t1 = peaks[i][config._IDX_TIME_J]
         for j in range(1, config.default_fan_value - 1):
@@ -261,9 +419,11 @@ def panako_mod(peaks, config: FingerprintConfig):
     return hash_dict
 
 
-def base(peaks, config: FingerprintConfig):
+def base(peaks, config: FingerprintConfig, num_anchors: int = None):
     hash_dict = {}
-    for i in range(0, len(peaks), 1):
+    if num_anchors is None:
+        num_anchors = len(peaks)
+    for i in range(0, num_anchors, 1):
         freq1 = peaks[i][config._IDX_FREQ_I]
         t1 = peaks[i][config._IDX_TIME_J]
         for j in range(1, config.default_fan_value):
@@ -287,9 +447,11 @@ def base(peaks, config: FingerprintConfig):
     return hash_dict
 
 
-def panako(peaks, config: FingerprintConfig):
+def panako(peaks, config: FingerprintConfig, num_anchors: int = None):
     hash_dict = {}
-    for i in range(0, len(peaks), 1):
+    if num_anchors is None:
+        num_anchors = len(peaks)
+    for i in range(0, num_anchors, 1):
         freq1 = peaks[i][config._IDX_FREQ_I]
         t1 = peaks[i][config._IDX_TIME_J]
         for j in range(1, config.default_fan_value - 1):
@@ -327,9 +489,11 @@ def panako(peaks, config: FingerprintConfig):
     return hash_dict
 
 
-def base_three(peaks, config: FingerprintConfig):
+def base_three(peaks, config: FingerprintConfig, num_anchors: int = None):
     hash_dict = {}
-    for i in range(0, len(peaks), 1):
+    if num_anchors is None:
+        num_anchors = len(peaks)
+    for i in range(0, num_anchors, 1):
         freq1 = peaks[i][config._IDX_FREQ_I]
         t1 = peaks[i][config._IDX_TIME_J]
         for j in range(1, config.default_fan_value - 1):
@@ -365,3 +529,362 @@ def base_three(peaks, config: FingerprintConfig):
                                 else:
                                     hash_dict[h] += [int(t1)]
     return hash_dict
+
+
+# ---------------------------------------------------------------------------------
+# numpy hash engine
+#
+# Builds every peak pair/triple in the fan window as index arrays, filters them by
+# time delta with masks, and bit-packs the components of each hash style into a
+# 64 bit integer. Hashes are rendered as 16 character hex strings, so they can't
+# match hashes from the sha1 based styles above.
+#
+# Bit layout, most significant first
+#   base:       freq1 (13) | freq2 (13) | t_delta (12)
+#   panako_mod: freq1-freq2 (14) | freq2-freq3 (14) | time ratio (26)
+#   panako:     freq1-freq2 (14) | freq2-freq3 (14) | freq1//400 (5) | freq3//400 (5) | time ratio (26)
+#   base_three: freq1 (13) | freq2 (13) | freq3 (13) | t_delta1 (12) | t_delta2 (12)
+# Values too large for their field wrap around, which only adds collisions.
+
+_FREQ_BITS = 13
+_FREQ_DIFF_BITS = 14
+_BAND_BITS = 5
+_TIME_DELTA_BITS = 12
+_RATIO_BITS = 26
+
+# Rough number of candidate pairs/triples held in memory at once
+_HASH_CHUNK_SIZE = 2**21
+
+
+def numpy_hashes(
+    frequency_idx, time_idx, config: FingerprintConfig, num_anchors: int = None
+):
+    """
+    Vectorized counterpart to the hash style functions. Generates hashes
+    for the same peak pairs/triples, but as packed integers.
+
+    Args
+        frequency_idx (array[int]): frequency of each peak, sorted if config.peak_sort
+        time_idx (array[int]): time of each peak
+        config (FingerprintConfig): fingerprint config
+        num_anchors (int): only hashes peak pairs/triples starting in the first num_anchors
+            peaks, hashes all if None
+
+    Returns
+    -------
+        hashes (dict{str: [int]} or PackedHashes): hashes of the form dict{hash: location}
+        or PackedHashes if config.hash_format is "packed"
+    """
+    if config.hash_style not in ["base", "panako", "panako_mod", "base_three"]:
+        print(f'Hash style "{config.hash_style}" is not inplemented')
+        return None
+    hashes, offsets = _numpy_hash_arrays(
+        np.asarray(frequency_idx, dtype=np.int64),
+        np.asarray(time_idx, dtype=np.int64),
+        config,
+        num_anchors=num_anchors,
+    )
+    if config.hash_format == "packed":
+        return PackedHashes(hashes, offsets)
+    return _hash_arrays_to_dict(hashes, offsets)
+
+
+def _numpy_hash_arrays(
+    frequencies, times, config: FingerprintConfig, num_anchors: int = None
+):
+    """Returns parallel arrays of packed hashes and their time offsets"""
+    if num_anchors is None:
+        num_anchors = len(times)
+    hash_list, offset_list = [], []
+    if config.hash_style == "base":
+        for i, j in _peak_pairs(times, config, num_anchors):
+            hash_list.append(
+                _pack(
+                    (frequencies[i], _FREQ_BITS),
+                    (frequencies[j], _FREQ_BITS),
+                    (times[j] - times[i], _TIME_DELTA_BITS),
+                )
+            )
+            offset_list.append(times[i])
+    else:
+        for i, j, k in _peak_triples(times, config, num_anchors):
+            hash_list.append(_pack_triple(frequencies, times, i, j, k, config))
+            offset_list.append(times[i])
+
+    if len(hash_list) == 0:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(hash_list), np.concatenate(offset_list)
+
+
+def _pack_triple(frequencies, times, i, j, k, config: FingerprintConfig):
+    freq1, freq2, freq3 = frequencies[i], frequencies[j], frequencies[k]
+    if config.hash_style == "base_three":
+        return _pack(
+            (freq1, _FREQ_BITS),
+            (freq2, _FREQ_BITS),
+            (freq3, _FREQ_BITS),
+            (times[k] - times[i], _TIME_DELTA_BITS),
+            (times[j] - times[i], _TIME_DELTA_BITS),
+        )
+
+    t_delta1 = times[k] - times[i]
+    t_delta2 = times[j] - times[i]
+    ratio = np.divide(
+        t_delta2,
+        t_delta1,
+        out=np.zeros(len(t_delta1), dtype=np.float64),
+        where=t_delta1 != 0,
+    )
+    ratio = np.rint(ratio * (2**_RATIO_BITS - 1)).astype(np.int64)
+    if config.hash_style == "panako_mod":
+        return _pack(
+            (freq1 - freq2, _FREQ_DIFF_BITS),
+            (freq2 - freq3, _FREQ_DIFF_BITS),
+            (ratio, _RATIO_BITS),
+        )
+    return _pack(  # panako
+        (freq1 - freq2, _FREQ_DIFF_BITS),
+        (freq2 - freq3, _FREQ_DIFF_BITS),
+        (freq1 // 400, _BAND_BITS),
+        (freq3 // 400, _BAND_BITS),
+        (ratio, _RATIO_BITS),
+    )
+
+
+def _pack(*fields):
+    """Packs (values, num_bits) fields into uint64, first field in the highest bits"""
+    packed = np.zeros(len(fields[0][0]), dtype=np.uint64)
+    for values, num_bits in fields:
+        packed <<= np.uint64(num_bits)
+        # two's complement keeps negative differences distinct within the field
+        packed |= values.astype(np.uint64) & np.uint64(2**num_bits - 1)
+    return packed
+
+
+def _valid_time_deltas(
+    times,
+    start: int,
+    max_distance: int,
+    chunk: int,
+    config: FingerprintConfig,
+    num_anchors: int = None,
+):
+    """
+    Mask of shape (chunk, max_distance + 1) where [i, d] is True if peak start + i + d
+    exists and is within the hash time delta thresholds of peak start + i, for the
+    first num_anchors peaks
+    """
+    if num_anchors is None:
+        num_anchors = len(times)
+    window = times[start : start + chunk + max_distance]
+    padded = np.concatenate([window, np.zeros(max_distance, dtype=times.dtype)])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, max_distance + 1)
+    num_rows = min(chunk, num_anchors - start)
+    t_deltas = windows[:num_rows] - window[:num_rows, None]
+    valid = (t_deltas >= config.min_hash_time_delta) & (
+        t_deltas <= config.max_hash_time_delta
+    )
+    valid &= (np.arange(start, start + num_rows)[:, None] + np.arange(max_distance + 1)) < len(times)
+    return valid
+
+
+def _peak_pairs(times, config: FingerprintConfig, num_anchors: int):
+    """Yields chunks of (i, j) peak indices, ordered like the loops in base"""
+    max_distance = config.default_fan_value - 1
+    if max_distance < 1:
+        return
+    chunk = max(_HASH_CHUNK_SIZE // (max_distance + 1), 1)
+    for start in range(0, num_anchors, chunk):
+        valid = _valid_time_deltas(
+            times, start, max_distance, chunk, config, num_anchors
+        )
+        valid[:, 0] = False
+        rows, distances = np.nonzero(valid)
+        rows += start
+        yield rows, rows + distances
+
+
+def _peak_triples(times, config: FingerprintConfig, num_anchors: int):
+    """Yields chunks of (i, j, k) peak indices, ordered like the loops in panako_mod"""
+    max_distance = config.default_fan_value - 1
+    second, third = np.triu_indices(max_distance + 1, k=1)
+    keep = second >= 1
+    second, third = second[keep], third[keep]
+    if len(second) == 0:
+        return
+    chunk = max(_HASH_CHUNK_SIZE // len(second), 1)
+    for start in range(0, num_anchors, chunk):
+        valid = _valid_time_deltas(
+            times, start, max_distance, chunk, config, num_anchors
+        )
+        rows, combos = np.nonzero(valid[:, second] & valid[:, third])
+        rows += start
+        yield rows, rows + second[combos], rows + third[combos]
+
+
+def _hash_arrays_to_dict(hashes, offsets):
+    """Groups parallel hash and offset arrays into dict{hex hash: [offsets]}"""
+    if len(hashes) == 0:
+        return {}
+    order = np.argsort(hashes, kind="stable")
+    hashes = hashes[order]
+    offsets = offsets[order].tolist()
+    starts = np.flatnonzero(np.diff(hashes)) + 1
+    keys = _hex_strings(hashes[np.concatenate([[0], starts])])
+    starts = [0] + starts.tolist()
+    ends = starts[1:] + [len(offsets)]
+    return dict(
+        zip(keys, [offsets[start:end] for start, end in zip(starts, ends)])
+    )
+
+
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+
+
+def _hex_strings(hashes):
+    """Formats uint64 hashes as 16 character hex strings without a python loop"""
+    hash_bytes = hashes.astype(">u8").view(np.uint8).reshape(-1, 8)
+    nibbles = np.empty((len(hashes), 16), dtype=np.uint8)
+    nibbles[:, 0::2] = hash_bytes >> 4
+    nibbles[:, 1::2] = hash_bytes & 15
+    return _HEX_DIGITS[nibbles].view("S16").ravel().astype("U16").tolist()
+
+
+# ---------------------------------------------------------------------------------
+# packed hashes
+
+
+class PackedHashes:
+    """
+    Fingerprints of one file as parallel numpy arrays sorted by hash.
+
+    Hashes are uint64. Hex string hashes from hash dicts are packed from their first
+    16 hex characters, so sha1 hashes can be packed too. len() is the number of unique
+    hashes, the same as len() of the equivalent hash dict.
+
+    Args
+        hashes (array[uint64]): hash of each fingerprint
+        offsets (array[int]): time offset of each fingerprint
+        is_sorted (bool): set if hashes are already sorted
+    """
+
+    __slots__ = ("hashes", "offsets", "num_unique")
+
+    def __init__(self, hashes, offsets, is_sorted: bool = False):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        offsets = np.asarray(offsets, dtype=np.int32)
+        if not is_sorted:
+            order = np.argsort(hashes, kind="stable")
+            hashes, offsets = hashes[order], offsets[order]
+        self.hashes = hashes
+        self.offsets = offsets
+        self.num_unique = (
+            int(np.count_nonzero(np.diff(hashes))) + 1 if len(hashes) > 0 else 0
+        )
+
+    def __len__(self):
+        return self.num_unique
+
+    def __getstate__(self):
+        return self.hashes, self.offsets, self.num_unique
+
+    def __setstate__(self, state):
+        self.hashes, self.offsets, self.num_unique = state
+
+    @classmethod
+    def from_dict(cls, hash_dict: dict):
+        """Packs a hash dict of the form dict{hash: [offsets]}"""
+        counts = [len(offsets) for offsets in hash_dict.values()]
+        hashes = np.repeat(
+            np.array([int(h[:16], 16) for h in hash_dict.keys()], dtype=np.uint64),
+            counts,
+        )
+        offsets = np.fromiter(
+            (offset for offsets in hash_dict.values() for offset in offsets),
+            dtype=np.int32,
+            count=sum(counts),
+        )
+        return cls(hashes, offsets)
+
+    def to_dict(self) -> dict:
+        """Unpacks into a hash dict of the form dict{hex hash: [offsets]}"""
+        return _hash_arrays_to_dict(self.hashes, self.offsets)
+
+    def unique(self):
+        """Returns the unique hashes, their first index, and number of occurences"""
+        starts = np.flatnonzero(np.diff(self.hashes)) + 1
+        starts = np.concatenate([[0], starts]) if len(self.hashes) > 0 else starts
+        counts = np.diff(np.concatenate([starts, [len(self.hashes)]]))
+        return self.hashes[starts], starts, counts
+
+
+class StoredHashes:
+    """
+    Fingerprints of one file that stay in a fingerprint database until they're packed
+
+    len() is the number of unique hashes, read from the database header. The hash
+    index searches the database directly, so stored hashes are only read from disk
+    when packed, e.g. to recognize the stored file against other files.
+
+    Args
+        database (FingerprintDatabase): database holding the fingerprints
+        name (str): file name in the database
+        num_hashes (int): number of unique hashes
+    """
+
+    __slots__ = ("database", "name", "num_hashes")
+
+    def __init__(self, database, name: str, num_hashes: int):
+        self.database = database
+        self.name = name
+        self.num_hashes = num_hashes
+
+    def __len__(self):
+        return self.num_hashes
+
+    def packed(self):
+        """Reads the fingerprints from the database as PackedHashes"""
+        return self.database.packed(self.name)
+
+    def to_dict(self) -> dict:
+        """Unpacks into a hash dict of the form dict{hex hash: [offsets]}"""
+        return self.packed().to_dict()
+
+
+def pack_hashes(hashes):
+    """Returns hashes as PackedHashes, packing hash dicts and reading stored hashes"""
+    if isinstance(hashes, PackedHashes):
+        return hashes
+    if isinstance(hashes, StoredHashes):
+        return hashes.packed()
+    return PackedHashes.from_dict(hashes)
+
+
+def _pair_indices(t_unique, t_starts, t_counts, against_hashes):
+    """
+    Cross product of target and against indices for every shared hash
+
+    Args
+        t_unique (array[uint64]): unique target hashes
+        t_starts (array[int]): index of the first occurence of each unique target hash
+        t_counts (array[int]): number of occurences of each unique target hash
+        against_hashes (array[uint64]): sorted hashes to match against
+
+    Returns
+    -------
+        t_index, a_index (array[int], array[int]): indices of each matching pair
+    """
+    a_starts = np.searchsorted(against_hashes, t_unique, side="left")
+    a_counts = np.searchsorted(against_hashes, t_unique, side="right") - a_starts
+    found = a_counts > 0
+    t_starts, t_counts = t_starts[found], t_counts[found]
+    a_starts, a_counts = a_starts[found], a_counts[found]
+
+    num_pairs = t_counts * a_counts
+    hash_index = np.repeat(np.arange(len(num_pairs)), num_pairs)
+    within = np.arange(num_pairs.sum()) - np.repeat(
+        np.cumsum(num_pairs) - num_pairs, num_pairs
+    )
+    t_index = t_starts[hash_index] + within // a_counts[hash_index]
+    a_index = a_starts[hash_index] + within % a_counts[hash_index]
+    return t_index, a_index
@@ -0,0 +1,264 @@
+import numpy as np
+
+import audalign.recognizers.fingerprint.fingerprinter as fingerprinter
+
+
+class HashIndex:
+    """
+    Inverted index of hash -> (file_id, offset) across all fingerprinted files
+
+    Each added file becomes a segment of arrays sorted by hash. Segments of similar
+    size are merged as files are added, so a query only searches a handful of
+    segments. Removed files are left in their segments until enough of the index is
+    removed to be worth compacting, and are filtered out of query results until then.
+
+    Files added as StoredHashes aren't read into segments. Their fingerprint database
+    is searched in place, with its file ids mapped to the index's.
+    """
+
+    def __init__(self):
+        self._file_ids = {}  # name -> file_id
+        self._names = {}  # file_id -> name
+        self._next_id = 0
+        self._segments = []  # [hashes, file_ids, offsets]
+        self._removed_ids = set()
+        self._num_removed = 0
+        self._num_fingerprints = {}  # file_id -> number of index entries
+        self._databases = []  # [database, array of index file_id by database file_id]
+        self._stored = {}  # file_id -> (position in _databases, database file_id)
+
+    def __len__(self):
+        return len(self._file_ids)
+
+    def __contains__(self, name: str):
+        return name in self._file_ids
+
+    def add(self, name: str, hashes) -> None:
+        """Adds a file's hash dict, PackedHashes or StoredHashes to the index, if not already in it"""
+        if name in self._file_ids or hashes is None:
+            return
+        file_id = self._next_id
+        self._next_id += 1
+        self._file_ids[name] = file_id
+        self._names[file_id] = name
+        if isinstance(hashes, fingerprinter.StoredHashes):
+            self._add_stored(file_id, hashes)
+            return
+        packed = fingerprinter.pack_hashes(hashes)
+        self._num_fingerprints[file_id] = len(packed.hashes)
+        self._segments.append(
+            [
+                packed.hashes,
+                np.full(len(packed.hashes), file_id, dtype=np.int32),
+                packed.offsets,
+            ]
+        )
+        while (
+            len(self._segments) > 1
+            and len(self._segments[-2][0]) <= 2 * len(self._segments[-1][0])
+        ):
+            self._segments.append(
+                _merge_segments(self._segments.pop(-2), self._segments.pop())
+            )
+
+    def remove(self, name: str) -> None:
+        """Removes a file from the index
+
+        Raises:
+            KeyError: if name is not in the index
+        """
+        file_id = self._file_ids.pop(name)
+        self._names.pop(file_id)
+        if file_id in self._stored:
+            position, database_file_id = self._stored.pop(file_id)
+            self._databases[position][1][database_file_id] = -1
+            return
+        self._removed_ids.add(file_id)
+        self._num_removed += self._num_fingerprints.pop(file_id)
+        if self._num_removed * 2 > sum(len(x[0]) for x in self._segments):
+            self._compact()
+
+    def clear(self) -> None:
+        self.__init__()
+
+    def names(self) -> list:
+        return list(self._file_ids.keys())
+
+    def name(self, file_id: int) -> str:
+        return self._names[file_id]
+
+    def file_id(self, name: str) -> int:
+        return self._file_ids[name]
+
+    def find_matches(self, target, exclude_names: list = (), hash_order=None):
+        """
+        Finds every occurence of the target's hashes in the index
+
+        Args
+            target (dict or PackedHashes): hashes of target file
+            exclude_names (list[str]): file names to leave out of the matches
+            hash_order (array[int], optional): target_hash_order of the target, if
+                target was packed from a hash dict
+
+        Returns
+        -------
+            file_ids, t_offsets, a_offsets (array[int], array[int], array[int]): file id,
+            target offset, and against offset of each matching pair of fingerprints,
+            ordered like find_segment_matches
+        """
+        if hash_order is None:
+            hash_order = target_hash_order(target)
+        target = fingerprinter.pack_hashes(target)
+        exclude_ids = [
+            self._file_ids[name] for name in exclude_names if name in self._file_ids
+        ]
+        matches = find_segment_matches(
+            self._segments, target, list(self._removed_ids) + exclude_ids, hash_order
+        )
+        if len(self._stored) == 0:
+            return matches
+
+        matches_list = [matches]
+        for database, id_map in self._databases:
+            database_exclude_ids = np.flatnonzero(
+                (id_map < 0) | np.isin(id_map, exclude_ids)
+            )
+            if len(database_exclude_ids) == len(id_map):
+                continue
+            file_ids, t_offsets, a_offsets = find_segment_matches(
+                [database.segment], target, database_exclude_ids, hash_order
+            )
+            matches_list.append((id_map[file_ids], t_offsets, a_offsets))
+        file_ids = np.concatenate([x[0] for x in matches_list])
+        order = np.argsort(file_ids, kind="stable")
+        return (
+            file_ids[order],
+            np.concatenate([x[1] for x in matches_list])[order],
+            np.concatenate([x[2] for x in matches_list])[order],
+        )
+
+    def _add_stored(self, file_id: int, hashes) -> None:
+        """Maps a file in a fingerprint database to file_id"""
+        for position, (database, id_map) in enumerate(self._databases):
+            if database is hashes.database:
+                break
+        else:
+            position = len(self._databases)
+            id_map = np.full(len(hashes.database), -1, dtype=np.int32)
+            self._databases.append([hashes.database, id_map])
+        database_file_id = hashes.database.file_id(hashes.name)
+        id_map[database_file_id] = file_id
+        self._stored[file_id] = (position, database_file_id)
+
+    def _compact(self) -> None:
+        """Merges all segments into one without removed files"""
+        removed_ids = np.array(list(self._removed_ids), dtype=np.int32)
+        segments = []
+        for hashes, file_ids, offsets in self._segments:
+            keep = ~np.isin(file_ids, removed_ids)
+            segments.append([hashes[keep], file_ids[keep], offsets[keep]])
+        self._segments = []
+        if len(segments) > 0:
+            hashes = np.concatenate([x[0] for x in segments])
+            order = np.argsort(hashes, kind="stable")
+            self._segments = [
+                [
+                    hashes[order],
+                    np.concatenate([x[1] for x in segments])[order],
+                    np.concatenate([x[2] for x in segments])[order],
+                ]
+            ]
+        self._removed_ids = set()
+        self._num_removed = 0
+
+
+def target_hash_order(target):
+    """
+    Position of each unique hash of a hash dict target in the order of its keys
+
+    Matches ordered by it come out in the same order as looping over the hash dict,
+    so offsets with the same confidence are ranked the same as before hashes were
+    indexed. None if target isn't a hash dict, its matches are then ordered by hash.
+    """
+    if not isinstance(target, dict):
+        return None
+    key_hashes = np.array(
+        [int(h[:16], 16) for h, offsets in target.items() if len(offsets) > 0],
+        dtype=np.uint64,
+    )
+    _, first_index = np.unique(key_hashes, return_index=True)
+    return first_index
+
+
+def find_segment_matches(
+    segments: list, target, exclude_ids: list = (), hash_order=None
+):
+    """
+    Finds every occurence of the target's hashes in segments of arrays sorted by hash
+
+    Args
+        segments (list[[array[uint64], array[int], array[int]]]): hashes, file ids and
+            offsets of each segment, sorted by hash
+        target (dict or PackedHashes): hashes of target file
+        exclude_ids (list[int]): file ids to leave out of the matches
+        hash_order (array[int], optional): target_hash_order of the target, if
+            target was packed from a hash dict
+
+    Returns
+    -------
+        file_ids, t_offsets, a_offsets (array[int], array[int], array[int]): file id,
+        target offset, and against offset of each matching pair of fingerprints,
+        ordered by file id, then by hash_order or hash, then by target and against
+        offset in the order they were fingerprinted
+    """
+    if hash_order is None:
+        hash_order = target_hash_order(target)
+    target = fingerprinter.pack_hashes(target)
+    t_unique, t_starts, t_counts = target.unique()
+    exclude_ids = np.array(exclude_ids, dtype=np.int32)
+    if hash_order is not None:
+        # hash_order of each target fingerprint
+        t_order = np.repeat(hash_order, t_counts)
+
+    file_ids_list, t_offsets_list, a_offsets_list = [], [], []
+    t_order_list = []
+    for hashes, file_ids, offsets in segments:
+        t_index, a_index = fingerprinter._pair_indices(
+            t_unique, t_starts, t_counts, hashes
+        )
+        match_file_ids = file_ids[a_index]
+        if len(exclude_ids) > 0:
+            keep = ~np.isin(match_file_ids, exclude_ids)
+            t_index, a_index = t_index[keep], a_index[keep]
+            match_file_ids = match_file_ids[keep]
+        file_ids_list.append(match_file_ids)
+        t_offsets_list.append(target.offsets[t_index])
+        a_offsets_list.append(offsets[a_index])
+        if hash_order is not None:
+            t_order_list.append(t_order[t_index])
+
+    if len(file_ids_list) == 0:
+        empty = np.zeros(0, dtype=np.int32)
+        return empty, empty, empty
+    file_ids = np.concatenate(file_ids_list)
+    if hash_order is None:
+        order = np.argsort(file_ids, kind="stable")
+    else:
+        # every file is in one segment, where its pairs are grouped by hash
+        order = np.lexsort((np.concatenate(t_order_list), file_ids))
+    return (
+        file_ids[order],
+        np.concatenate(t_offsets_list)[order],
+        np.concatenate(a_offsets_list)[order],
+    )
+
+
+def _merge_segments(older: list, newer: list) -> list:
+    """Merges two segments into one sorted by hash, older entries first for equal hashes"""
+    hashes = np.concatenate([older[0], newer[0]])
+    order = np.argsort(hashes, kind="stable")
+    return [
+        hashes[order],
+        np.concatenate([older[1], newer[1]])[order],
+        np.concatenate([older[2], newer[2]])[order],
+    ]
@@ -1,6 +1,7 @@
 import os
 import time
 
+import numpy as np
 from audalign.recognizers.fingerprint import FingerprintConfig
 
 
@@ -56,11 +57,24 @@ def recognize(recognizer, file_path: str, config: FingerprintConfig):
         )
 
     t = time.time()
-    matches = find_matches(recognizer, file_path)
-    if config.locality:
-        rough_match = locality_align_matches(matches, locality, locality_filter_prop)
+    shards = recognizer._recognition_shards()
+    if shards is None:
+        file_names, matches = find_matches(recognizer, file_path)
+        rough_match = rough_align_matches(
+            file_names,
+            matches,
+            locality if config.locality else None,
+            locality_filter_prop,
+        )
     else:
-        rough_match = align_matches(matches)
+        target_mapper, exclude_names = find_target(recognizer, file_path)
+        print(f"{os.path.basename(file_path)}: Finding Matches...  ", end="")
+        rough_match = shards.align_matches(
+            target_mapper,
+            exclude_names,
+            locality if config.locality else None,
+            locality_filter_prop,
+        )
 
     filter_set = False
 
@@ -103,44 +117,96 @@ def find_matches(
 
     Returns
     -------
-        Matches(list[str, int, int, int]): list of all matches, file_name match, corresponding offset, target location, file_match offset
+        file_names (list[str]): names of matched files, indexed by file id in matches
+        matches (array[int, int, int, int]): array of shape (n, 4) of all matches, file id, corresponding offset, target location, file_match offset
     """
-    file_name = os.path.basename(file_path)
+    target_mapper, exclude_names = find_target(recognizer, file_path)
+
+    hash_index = recognizer._hash_index
+    if len(hash_index) != len(recognizer._files):
+        recognizer.sync_hash_index()
+
+    print(f"{os.path.basename(file_path)}: Finding Matches...  ", end="")
+    file_ids, t_offsets, a_offsets = hash_index.find_matches(
+        target_mapper, exclude_names=exclude_names
+    )
+    return match_array(hash_index, file_ids, t_offsets, a_offsets)
 
-    target_mapper = {}
 
-    if file_name not in recognizer.file_names:
+def find_target(recognizer, file_path):
+    """
+    Gets the target's hashes, fingerprinting it if it isn't already fingerprinted
+
+    Args
+        recognizer (FingerprintRecognizer): recognizer with fingerprinted files
+        file_path (str): file path of target file
+
+    Returns
+    -------
+        target_mapper, exclude_names (dict or PackedHashes, list[str]): hashes of target
+        file and names of fingerprinted files with the same name, ignoring case
+    """
+    file_name = os.path.basename(file_path)
+
+    target_mapper = recognizer._files.get(file_name)
+    if target_mapper is None:
         fingerprints = recognizer._fingerprint_file(file_path)
         target_mapper = fingerprints[1]
-    else:
-        for audio_file in recognizer.fingerprinted_files:
-            if audio_file[0] == file_name:
-                target_mapper = audio_file[1]
-                break
-
-    matches = []
-
-    print(f"{file_name}: Finding Matches...  ", end="")
-    for audio_file in recognizer.fingerprinted_files:
-        if audio_file[0].lower() != file_name.lower():
-            already_hashes = audio_file[1]
-            for t_hash in target_mapper.keys():
-                if t_hash in already_hashes.keys():
-                    for t_offset in target_mapper[t_hash]:
-                        for a_offset in already_hashes[t_hash]:
-                            sample_difference = a_offset - t_offset
-                            matches.append(
-                                [audio_file[0], sample_difference, t_offset, a_offset]
-                            )
-    return matches
-
-
-def align_matches(matches: list):
+
+    exclude_names = [
+        name for name in recognizer._files if name.lower() == file_name.lower()
+    ]
+    return target_mapper, exclude_names
+
+
+def match_array(hash_index, file_ids, t_offsets, a_offsets):
+    """
+    Builds the matches array from the matching pairs found by hash_index.find_matches
+
+    Returns
+    -------
+        file_names (list[str]): names of matched files, indexed by file id in matches
+        matches (array[int, int, int, int]): array of shape (n, 4) of all matches, file id, corresponding offset, target location, file_match offset
+    """
+    # file ids are made contiguous so they index file_names
+    unique_ids, file_ids = np.unique(file_ids, return_inverse=True)
+    file_names = [hash_index.name(file_id) for file_id in unique_ids.tolist()]
+
+    matches = np.empty((len(file_ids), 4), dtype=np.int64)
+    matches[:, 0] = file_ids
+    matches[:, 1] = a_offsets
+    matches[:, 1] -= t_offsets
+    matches[:, 2] = t_offsets
+    matches[:, 3] = a_offsets
+    return file_names, matches
+
+
+def rough_align_matches(
+    file_names: list, matches, locality: int, locality_filter_prop: float
+):
+    """Counts offsets of matches with locality_align_matches if locality is set, else align_matches"""
+    if locality:
+        return locality_align_matches(
+            file_names, matches, locality, locality_filter_prop
+        )
+    return align_matches(file_names, matches)
+
+
+def _file_slices(file_names: list, matches):
+    """Yields file name and its rows of matches, matches must be sorted by file id"""
+    bounds = np.searchsorted(matches[:, 0], np.arange(len(file_names) + 1))
+    for file_id, name in enumerate(file_names):
+        if bounds[file_id + 1] > bounds[file_id]:
+            yield name, matches[bounds[file_id] : bounds[file_id + 1]]
+
+
+def align_matches(file_names: list, matches):
     """
     takes matches from find_matches and converts it to a dictionary of counts per offset and file name
 
     Args
-        matches (list[str, int]): list of matches from find_matches
+        file_names (list[str]): file names from find_matches
+        matches (array[int, int, int, int]): array of matches from find_matches
 
     Returns
     -------
@@ -149,174 +215,233 @@ def align_matches(matches: list):
 
     print("Aligning matches")
     sample_difference_counter = {}
-    for file_name, sample_difference, _, _ in matches:
-        if file_name not in sample_difference_counter:
-            sample_difference_counter[file_name] = {}
-        if sample_difference not in sample_difference_counter[file_name]:
-            sample_difference_counter[file_name][sample_difference] = [0, None]
-        sample_difference_counter[file_name][sample_difference][0] += 1
+    for file_name, file_matches in _file_slices(file_names, matches):
+        sample_differences, first_index, counts = np.unique(
+            file_matches[:, 1], return_index=True, return_counts=True
+        )
+        order = np.argsort(first_index)  # keeps order of first occurence
+        sample_difference_counter[file_name] = {
+            sample_difference: [count, None]
+            for sample_difference, count in zip(
+                sample_differences[order].tolist(), counts[order].tolist()
+            )
+        }
 
     return sample_difference_counter
 
 
-def locality_align_matches(matches: list, locality: int, locality_filter_prop: int):
+def locality_align_matches(
+    file_names: list, matches, locality: int, locality_filter_prop: int
+):
+    """
+    takes matches from find_matches and finds the confidence of each offset within
+    windows of locality frames in both the target and against file
+
+    Windows slide over matches sorted by target then against offset. Only the top 30
+    offsets by confidence are kept, with the locations where their confidence is at
+    least locality_filter_prop of their max confidence.
+
+    Args
+        file_names (list[str]): file names from find_matches
+        matches (array[int, int, int, int]): array of matches from find_matches
+        locality (int): size of windows in frames
+        locality_filter_prop (float): proportion of max confidence for locations to keep
+
+    Returns
+    -------
+        sample_difference_counter (dict): {file_name: {offset: [confidence, [loc_tups]]}}
+    """
 
     print("Aligning matches")
     sample_difference_counter = {}
-    file_dict = {}
-
-    # converting matches into file_dict of matches
-    for file_name, sample_difference, t_offset, a_offset in matches:
-        if file_dict.get(file_name) is None:
-            file_dict[file_name] = []
-        file_dict[file_name].append((sample_difference, t_offset, a_offset))
-
-    # shifting windows for each filename match
-    for name in file_dict.keys():
-        temp_file_dict = {}
-        start_window = 0
-        end_window = 1
-        last_end = 1
-
-        # sorts by t_offset
-        file_dict[name] = sorted(file_dict[name], key=lambda x: x[1])
-
-        while (
-            end_window < len(file_dict[name]) - 1
-            and file_dict[name][end_window][1] - file_dict[name][start_window][1]
-            <= locality
-        ):
-            end_window += 1
-            last_end = end_window
 
-        # moves end while there's room and locality is
-        while True:  # end_window <= len(file_dict[name]):
+    for name, file_matches in _file_slices(file_names, matches):
+        sample_differences, codes = np.unique(file_matches[:, 1], return_inverse=True)
+        order = np.argsort(file_matches[:, 2], kind="stable")  # sorts by t_offset
+        t_offsets = file_matches[order, 2]
+        a_offsets = file_matches[order, 3]
+        codes = codes[order]
+
+        # first pass finds the max confidence and first appearance of every offset
+        confidences = np.zeros(len(sample_differences), dtype=np.int64)
+        first_seen = np.full(len(sample_differences), -1, dtype=np.int64)
+        num_seen = 0
+        for _, _, starts, ends, window_codes in _locality_windows(
+            t_offsets, a_offsets, codes, locality
+        ):
+            positions, counts = _window_counts(starts, ends, window_codes)
+            if len(counts) == 0:
+                continue
+            window_codes = window_codes[positions]
+            np.maximum.at(confidences, window_codes, counts)
+
+            # windows that first contain each position, for the order of first appearance
+            unseen = first_seen[window_codes] == -1
+            if np.any(unseen):
+                appearance = (
+                    np.searchsorted(ends, positions[unseen], side="right")
+                    * len(codes)
+                    + positions[unseen]
+                )
+                appearance_order = np.argsort(appearance, kind="stable")
+                new_codes, first_index = np.unique(
+                    window_codes[unseen][appearance_order], return_index=True
+                )
+                new_codes = new_codes[np.argsort(first_index)]
+                first_seen[new_codes] = np.arange(
+                    num_seen, num_seen + len(new_codes)
+                )
+                num_seen += len(new_codes)
 
-            # {(toff, aoff): {samp_diff : confidence}}
-            toff_dict = find_loc_matches(
-                file_dict[name][start_window:end_window], locality
-            )
+        if num_seen == 0:
+            continue
 
-            # combines and turns into {offset: [confidence, [loc_tups]]}
-            for tup, samp_dict in toff_dict.items():
-                for samp_diff, confidence in samp_dict.items():
-                    if temp_file_dict.get(samp_diff) is None:
-                        temp_file_dict[samp_diff] = [confidence, []]
-                    elif temp_file_dict[samp_diff][0] < confidence:
-                        temp_file_dict[samp_diff][0] = confidence
-                    temp_file_dict[samp_diff][1] += [(*tup, confidence)]
-
-            # breaks out of while if at end of file and within locality
-            if end_window >= len(file_dict[name]):
-                break
-
-            while True:
-                start_window += 1
-                while (
-                    end_window <= len(file_dict[name]) - 1
-                    and file_dict[name][end_window][1]
-                    - file_dict[name][start_window][1]
-                    <= locality
-                ):
-                    end_window += 1
-                if end_window >= len(file_dict[name]):
-                    break
-                if end_window > last_end:
-                    last_end = end_window
-                    break
-
-        # # filter to top 30
-        if len(temp_file_dict.keys()) > 30:
-            temp_file_list = [
-                (samp_diff, conf_loc) for samp_diff, conf_loc in temp_file_dict.items()
+        # filter to top 30
+        top_codes = np.argsort(first_seen)[-num_seen:]
+        if num_seen > 30:
+            top_codes = top_codes[
+                np.argsort(-confidences[top_codes], kind="stable")[:30]
             ]
-            temp_file_list = sorted(
-                temp_file_list, key=lambda x: x[1][0], reverse=True
-            )  # sort by confidence
-            temp_file_dict = {}
-            for i in range(30):
-                temp_file_dict[temp_file_list[i][0]] = temp_file_list[i][1]
-
-        # locality_filter_prop
-        for _, matches in temp_file_dict.items():
-            index = 0
-            while index < len(matches[1]):
-                if matches[1][index][2] < matches[0] * locality_filter_prop:
-                    matches[1].pop(index)
-                    continue
-                index += 1
 
-        if len(temp_file_dict) > 0:
-            sample_difference_counter[name] = temp_file_dict
+        # second pass finds locations of top offsets above locality_filter_prop
+        is_top = np.zeros(len(sample_differences), dtype=bool)
+        is_top[top_codes] = True
+        thresholds = confidences * locality_filter_prop
+        loc_tups = {code: [] for code in top_codes.tolist()}
+        for t_mid, a_mids, starts, ends, window_codes in _locality_windows(
+            t_offsets, a_offsets, codes, locality
+        ):
+            positions = np.flatnonzero(is_top[window_codes])
+            if len(positions) == 0:
+                continue
+            window_codes = window_codes[positions]
+            # counts each top code within each a_offset window by sorting positions
+            # by (code, position), where a window's matches of a code are the run of
+            # keys between (code, start) and (code, end)
+            code_order = np.argsort(window_codes, kind="stable")
+            keys = window_codes[code_order] * len(codes) + positions[code_order]
+            present = np.unique(window_codes)
+            counts = np.searchsorted(
+                keys, present[:, None] * len(codes) + ends
+            ) - np.searchsorted(keys, present[:, None] * len(codes) + starts)
+            code_index, window_index = np.nonzero(
+                (counts > 0) & ~(counts < thresholds[present][:, None])
+            )
+            for code, a_mid, confidence in zip(
+                present[code_index].tolist(),
+                a_mids[window_index].tolist(),
+                counts[code_index, window_index].tolist(),
+            ):
+                loc_tups[code].append((t_mid, a_mid, confidence))
+
+        sample_difference_counter[name] = {
+            sample_differences[code].item(): [confidences[code].item(), loc_tups[code]]
+            for code in top_codes.tolist()
+        }
 
     # return {filename: {offset: [confidence, [loc_tups]]}}
     return sample_difference_counter
 
 
-def find_loc_matches(matches_list: list, locality: int):
-    """receives from align matches locality,
-        matcheslist = [(sample_difference, t_offset, a_offset)]
+def _locality_windows(t_offsets, a_offsets, codes, locality: int):
+    """
+    Yields windows of locality frames over matches sorted by t_offset, each split into
+    windows of locality frames over a_offset
+
+    Args
+        t_offsets (array[int]): sorted target offsets of matches
+        a_offsets (array[int]): against offsets of matches
+        codes (array[int]): offset code of each match
+        locality (int): size of windows in frames
+
+    Yields
+    ------
+        t_mid (int): middle t_offset of the window
+        a_mids (array[int]): middle a_offset of each a_offset window
+        starts, ends (array[int], array[int]): bounds of each a_offset window
+        window_codes (array[int]): offset codes of the window sorted by a_offset
+    """
+    # the first window doesn't include the last match unless it's the only one
+    first_end = np.searchsorted(t_offsets, t_offsets[0] + locality, side="right")
+    t_starts, t_ends = _sliding_windows(
+        t_offsets, locality, first_end=max(min(len(t_offsets) - 1, first_end), 1)
+    )
+    for t_start, t_end in zip(t_starts.tolist(), t_ends.tolist()):
+        t_mid = (t_offsets[t_start] + t_offsets[t_end - 1]).item() // 2
+        order = np.argsort(a_offsets[t_start:t_end], kind="stable")
+        window_a_offsets = a_offsets[t_start:t_end][order]
+
+        # a_offset windows don't include their last match, though it's in the middle
+        starts, ends = _sliding_windows(window_a_offsets, locality)
+        ends -= 1
+        a_mids = (window_a_offsets[starts] + window_a_offsets[ends]) // 2
+
+        # windows with the same middle replace each other, so only the last is kept
+        keep = np.append(a_mids[1:] != a_mids[:-1], True)
+        yield t_mid, a_mids[keep], starts[keep], ends[keep], codes[t_start:t_end][
+            order
+        ]
+
+
+def _sliding_windows(values, locality: int, first_end: int = None):
+    """
+    Bounds of windows sliding over sorted values, one for each time the window grows to
+    include more values, until it reaches the end
+
+    Args
+        values (array[int]): sorted values
+        locality (int): max difference of values within a window
+        first_end (int): end of the first window, if it differs from the rest
+
+    Returns
+    -------
+        starts, ends (array[int], array[int]): start and exclusive end of each window
+    """
+    # a window starting at each value ends at the first value more than locality
+    # past it. Like the old loop, the start moves on one value at a time and a window
+    # is only kept when its end grows, so a start whose end is no further than the
+    # previous start's is skipped. The running max makes ends never shrink, and the
+    # kept windows are the starts where it grows
+    ends = np.searchsorted(values, values + locality, side="right")
+    if first_end is not None:
+        ends[0] = first_end
+    ends = np.maximum.accumulate(ends)
+    starts = np.flatnonzero(np.append(True, ends[1:] > ends[:-1]))
+    ends = ends[starts]
+    # windows stop at the first that reaches the end of values
+    last = np.searchsorted(ends, len(values)) + 1
+    return starts[:last], ends[:last]
+
+
+def _window_counts(starts, ends, codes):
+    """
+    Finds the max count of each position's code over the windows containing it
 
-    Args:
-        matches_list (list): [(sample_difference, t_offset, a_offset)]
-        locality (int): [description]
+    Args
+        starts, ends (array[int], array[int]): sorted bounds of windows
+        codes (array[int]): code of each position
 
-    Returns:
-        [dict]: {(toff, aoff): {samp_diff : confidence}}
+    Returns
+    -------
+        positions (array[int]): positions in at least one window
+        counts (array[int]): max count of the position's code in windows containing it,
+            counting from that position
     """
-    # matches_list = list(set(matches_list))
-
-    a_matches = sorted(matches_list, key=lambda x: x[2])
-    temp_file_dict = {}
-    start_window = 0
-    end_window = 0
-    last_end = 0
-
-    while (
-        end_window < len(a_matches) - 1
-        and a_matches[end_window + 1][2] - a_matches[start_window][2] <= locality
-    ):
-        end_window += 1
-        last_end = end_window
-
-    while True:  # end_window <= len(a_matches):
-
-        loc_tup = (
-            ((matches_list[-1][1] - matches_list[0][1]) // 2) + matches_list[0][1],
-            ((a_matches[end_window][2] - a_matches[start_window][2]) // 2)
-            + a_matches[start_window][2],
-        )
-        # loc_tup = ( # Old version
-        #     (matches_list[-1][1] - matches_list[0][1]) // 2,
-        #     (a_matches[end_window][2] - a_matches[start_window][2]) // 2,
-        # )
-        temp_file_dict[loc_tup] = {}
-        for sample_difference, t_offset, a_offset in a_matches[start_window:end_window]:
-            if sample_difference not in temp_file_dict[loc_tup].keys():
-                temp_file_dict[loc_tup][sample_difference] = 0
-            temp_file_dict[loc_tup][sample_difference] += 1
-        # gives us temp_file_dict--- {(toff, aoff): {samp_diff : confidence}}
-
-        # breaks out of while if at end of file and within locality
-
-        if end_window >= len(a_matches) - 1:
-            break
-
-        while True:
-            start_window += 1
-            while (
-                end_window < len(a_matches) - 1
-                and a_matches[end_window + 1][2] - a_matches[start_window][2]
-                <= locality
-            ):
-                end_window += 1
-            if end_window >= len(a_matches) - 1:
-                break
-            if end_window > last_end:
-                last_end = end_window
-                break
-
-    return temp_file_dict
+    if len(starts) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    positions = np.arange(len(codes))
+    # last window starting at or before each position has the furthest end
+    windows = np.searchsorted(starts, positions, side="right") - 1
+    covered = (windows >= 0) & (ends[np.maximum(windows, 0)] > positions)
+    code_order = np.argsort(codes, kind="stable")
+    keys = codes[code_order] * len(codes) + code_order
+    # number of same code positions from the position up to the end of the window
+    counts = np.searchsorted(
+        keys, codes[code_order] * len(codes) + ends[np.maximum(windows, 0)][code_order]
+    ) - np.arange(len(codes))
+    positions = code_order[covered[code_order]]
+    return positions, counts[covered[code_order]]
 
 
 def process_results(
@@ -0,0 +1,195 @@
+import multiprocessing
+import weakref
+
+import audalign.recognizers.fingerprint.fingerprinter as fingerprinter
+import audalign.recognizers.fingerprint.recognize as recognize
+from audalign.recognizers.fingerprint.hash_index import HashIndex, target_hash_order
+
+
+class ShardedHashIndex:
+    """
+    Fingerprinted files partitioned across worker processes
+
+    Each worker holds a hash index of its shard, a run of files with about the same
+    number of fingerprints as the other shards. A query sends the target's hashes to
+    every worker, which finds matches and counts offsets for its own files. Shards hold
+    different files, so their offset counts are merged by joining them, then put back
+    in the order files were added. Added files go to the shard with the fewest
+    fingerprints. Workers are stopped by close or when the index is garbage collected.
+
+    Args
+    ----
+        fingerprinted_files (list[[str, hashes]]): file names and hashes
+        num_shards (int): number of worker processes
+    """
+
+    def __init__(self, fingerprinted_files: list, num_shards: int):
+        self.num_shards = num_shards
+        self._workers = []  # (connection, process)
+        self._shard_sizes = []  # number of fingerprints in each shard
+        self._shards = {}  # name -> shard
+        self._positions = {}  # name -> order added
+        self._next_position = 0
+        self._finalizer = weakref.finalize(self, _stop_workers, self._workers)
+
+        total_fingerprints = max(sum(len(x[1]) for x in fingerprinted_files), 1)
+        start, fingerprints = 0, 0
+        for i, (_, hashes) in enumerate(fingerprinted_files):
+            fingerprints += len(hashes)
+            end = i + 1
+            if (
+                fingerprints * num_shards
+                >= total_fingerprints * (len(self._workers) + 1)
+                or end == len(fingerprinted_files)
+            ):
+                self._start_worker(fingerprinted_files[start:end])
+                start = end
+        while len(self._workers) < num_shards:
+            self._start_worker([])
+
+    def __len__(self):
+        return len(self._shards)
+
+    def __contains__(self, name: str):
+        return name in self._shards
+
+    def add(self, name: str, hashes) -> None:
+        """Adds a file to the shard with the fewest fingerprints, if not already in the index"""
+        if name in self._shards or hashes is None:
+            return
+        shard = self._shard_sizes.index(min(self._shard_sizes))
+        self._request(shard, ("add", name, hashes))
+        self._register(name, shard, len(hashes))
+
+    def remove(self, name: str) -> None:
+        """Removes a file from its shard
+
+        Raises:
+            KeyError: if name is not in the index
+        """
+        shard = self._shards.pop(name)
+        self._positions.pop(name)
+        self._request(shard, ("remove", name))
+
+    def align_matches(
+        self, target, exclude_names: list, locality: int, locality_filter_prop: float
+    ) -> dict:
+        """
+        Finds matches and counts their offsets in every shard
+
+        Args
+            target (dict or PackedHashes): hashes of target file
+            exclude_names (list[str]): file names to leave out of the matches
+            locality (int): locality in frames, None counts offsets of whole files
+            locality_filter_prop (float): locality_align_matches filter proportion
+
+        Returns
+        -------
+            rough_match (dict): recognize.rough_align_matches of all shards
+        """
+        request = (
+            "match",
+            fingerprinter.pack_hashes(target),
+            target_hash_order(target),
+            exclude_names,
+            locality,
+            locality_filter_prop,
+        )
+        for connection, _ in self._workers:
+            connection.send(request)
+        rough_match = {}
+        for result in [self._receive(connection) for connection, _ in self._workers]:
+            rough_match.update(result)
+        return {
+            name: rough_match[name]
+            for name in sorted(rough_match, key=self._positions.__getitem__)
+        }
+
+    def close(self) -> None:
+        """Stops every worker"""
+        self._finalizer()
+
+    def _start_worker(self, fingerprinted_files: list) -> None:
+        connection, worker_connection = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=_shard_worker,
+            args=(worker_connection, fingerprinted_files),
+            daemon=True,
+        )
+        process.start()
+        worker_connection.close()
+        self._workers.append((connection, process))
+        self._shard_sizes.append(0)
+        for name, hashes in fingerprinted_files:
+            self._register(name, len(self._workers) - 1, len(hashes))
+
+    def _register(self, name: str, shard: int, num_fingerprints: int) -> None:
+        self._shards[name] = shard
+        self._shard_sizes[shard] += num_fingerprints
+        self._positions[name] = self._next_position
+        self._next_position += 1
+
+    def _request(self, shard: int, request: tuple):
+        connection = self._workers[shard][0]
+        connection.send(request)
+        return self._receive(connection)
+
+    @staticmethod
+    def _receive(connection):
+        result = connection.recv()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def _stop_workers(workers: list) -> None:
+    for connection, process in workers:
+        try:
+            connection.send(None)
+        except OSError:
+            pass
+        connection.close()
+        process.join()
+    workers.clear()
+
+
+def _shard_worker(connection, fingerprinted_files: list) -> None:
+    hash_index = HashIndex()
+    for name, hashes in fingerprinted_files:
+        hash_index.add(name, hashes)
+    del fingerprinted_files
+
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        try:
+            if request[0] == "add":
+                result = hash_index.add(request[1], request[2])
+            elif request[0] == "remove":
+                result = hash_index.remove(request[1])
+            else:
+                (
+                    _,
+                    target,
+                    hash_order,
+                    exclude_names,
+                    locality,
+                    locality_filter_prop,
+                ) = request
+                file_ids, t_offsets, a_offsets = hash_index.find_matches(
+                    target, exclude_names, hash_order
+                )
+                file_names, matches = recognize.match_array(
+                    hash_index, file_ids, t_offsets, a_offsets
+                )
+                result = recognize.rough_align_matches(
+                    file_names, matches, locality, locality_filter_prop
+                )
+        except Exception as e:
+            result = e
+        connection.send(result)
+    connection.close()
@@ -1,9 +1,9 @@
-import multiprocessing
 import os
 import sys
 import time
 from functools import partial
 
+import audalign.pool
 import audalign.recognizers.fingerprint.fingerprinter as fingerprint
 import matplotlib.pyplot as plt
 import numpy as np
@@ -113,27 +113,9 @@ def _visrecognize_directory(
     _file_audsegs: dict = None,
 ):
     img_width = get_frame_width(config)
-    if type(target_file_path) == str:
-        target_arr2d, transposed_target_arr2d = get_arrays(
-            target_file_path,
-            volume_floor=config.volume_floor,
-            vert_scaling=config.vert_scaling,
-            horiz_scaling=config.horiz_scaling,
-            start_end=config.start_end,
-            config=config,
-            _file_audsegs=_file_audsegs,
-        )
-
-        target_index_list = find_index_arr(
-            transposed_target_arr2d, config.volume_threshold, img_width
-        )
-    else:
-        (
-            target_file_path,
-            target_arr2d,
-            transposed_target_arr2d,
-            target_index_list,
-        ) = target_file_path
+    target_file_path, target_arr2d, target_index_list = target_file_path
+    target_arr2d = audalign.pool.unshare(target_arr2d)
+    transposed_target_arr2d = np.transpose(target_arr2d)
 
     file_path, _ = file_path
 
@@ -207,27 +189,20 @@ def visrecognize_directory(
 
     img_width = get_frame_width(config)
 
-    if config.multiprocessing is False:
-        target_arr2d, transposed_target_arr2d = get_arrays(
-            target_file_path,
-            volume_floor=config.volume_floor,
-            vert_scaling=config.vert_scaling,
-            horiz_scaling=config.horiz_scaling,
-            start_end=config.start_end,
-            config=config,
-            _file_audsegs=_file_audsegs,
-        )
-
-        target_index_list = find_index_arr(
-            transposed_target_arr2d, config.volume_threshold, img_width
-        )
+    # decoded once here rather than in every worker
+    target_arr2d, transposed_target_arr2d = get_arrays(
+        target_file_path,
+        volume_floor=config.volume_floor,
+        vert_scaling=config.vert_scaling,
+        horiz_scaling=config.horiz_scaling,
+        start_end=config.start_end,
+        config=config,
+        _file_audsegs=_file_audsegs,
+    )
 
-        target_file_path = (
-            target_file_path,
-            target_arr2d,
-            transposed_target_arr2d,
-            target_index_list,
-        )
+    target_index_list = find_index_arr(
+        transposed_target_arr2d, config.volume_threshold, img_width
+    )
 
     if type(against_directory) == str:
         against_files = list(find_files(against_directory))
@@ -236,29 +211,37 @@ def visrecognize_directory(
 
     _visrecognize_directory_ = partial(
         _visrecognize_directory,
-        target_file_path=target_file_path,
         config=config,
         _file_audsegs=_file_audsegs,
     )
 
-    if config.multiprocessing == False:
+    if config.multiprocessing == False or not audalign.pool.can_use_pool():
         results_list = []
         for file_path in against_files:
-            results_list += [_visrecognize_directory_(file_path)]
+            results_list += [
+                _visrecognize_directory_(
+                    file_path,
+                    target_file_path=(
+                        target_file_path,
+                        target_arr2d,
+                        target_index_list,
+                    ),
+                )
+            ]
     else:
-        try:
-            nprocesses = config.num_processors or multiprocessing.cpu_count()
-        except NotImplementedError:
-            nprocesses = 1
-        else:
-            nprocesses = 1 if nprocesses <= 0 else nprocesses
-
-        with multiprocessing.Pool(nprocesses) as pool:
+        pool = audalign.pool.get_pool(config.num_processors)
+        with audalign.pool.SharedArray(target_arr2d) as shared_target_arr2d:
             results_list = pool.map(
-                _visrecognize_directory_, tqdm.tqdm(list(against_files))
+                partial(
+                    _visrecognize_directory_,
+                    target_file_path=(
+                        target_file_path,
+                        shared_target_arr2d,
+                        target_index_list,
+                    ),
+                ),
+                tqdm.tqdm(list(against_files)),
             )
-            pool.close()
-            pool.join()
 
     file_match = {}
     for i in results_list:
@@ -271,10 +254,7 @@ def visrecognize_directory(
         result["match_time"] = t
         result["match_info"] = file_match
         if _include_filename:
-            if type(target_file_path) == tuple:
-                result["filename"] = target_file_path[0]
-            else:
-                result["filename"] = target_file_path
+            result["filename"] = target_file_path
         return result
 
     return None
@@ -330,23 +310,25 @@ def _visrecognize(
     )
 
     # calculate all mse and ssim values
-    if use_multiprocessing == True and sys.platform not in ["linux", "darwin"]:
-
-        try:
-            nprocesses = num_processes or multiprocessing.cpu_count()
-        except NotImplementedError:
-            nprocesses = 1
-        else:
-            nprocesses = 1 if nprocesses <= 0 else nprocesses
-
-        index_list = divy_index_list(
-            index_list, transposed_target_arr2d, transposed_against_arr2d, nprocesses
-        )
-
-        with multiprocessing.Pool(nprocesses) as pool:
-            results_list = pool.map(_calculate_comp_values, tqdm.tqdm(list(index_list)))
-            pool.close()
-            pool.join()
+    if (
+        use_multiprocessing == True
+        and sys.platform not in ["linux", "darwin"]
+        and audalign.pool.can_use_pool()
+    ):
+        nprocesses = audalign.pool.num_processes(num_processes)
+
+        pool = audalign.pool.get_pool(num_processes)
+        with audalign.pool.SharedArray(
+            transposed_target_arr2d
+        ) as shared_target_arr2d, audalign.pool.SharedArray(
+            transposed_against_arr2d
+        ) as shared_against_arr2d:
+            index_list = divy_index_list(
+                index_list, shared_target_arr2d, shared_against_arr2d, nprocesses
+            )
+            results_list = pool.map(
+                _calculate_comp_values, tqdm.tqdm(list(index_list))
+            )
     else:
         index_list = divy_index_list(
             index_list, transposed_target_arr2d, transposed_against_arr2d, 1
@@ -488,8 +470,8 @@ def calculate_comp_values(
     # Plus, finding the max only uses regions with large peaks, which could reduce
     # noisy secions being included.
     index_tuples = index_tuple_target_arr_against_arr[0]
-    target_arr2d = index_tuple_target_arr_against_arr[1]
-    against_arr2d = index_tuple_target_arr_against_arr[2]
+    target_arr2d = audalign.pool.unshare(index_tuple_target_arr_against_arr[1])
+    against_arr2d = audalign.pool.unshare(index_tuple_target_arr_against_arr[2])
     results_list = []
     for index_tuple in tqdm.tqdm(index_tuples):
         try:
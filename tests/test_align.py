@@ -1,6 +1,7 @@
 import pickle
 
 import audalign as ad
+import audalign.pool
 import pytest
 from audalign import recognizers
 
@@ -73,6 +74,18 @@ class TestAlign:
         )
         assert result
 
+    def test_align_cor_in_worker(self, monkeypatch):
+        # pool workers can't start processes, so alignment runs serially there
+        def no_pool(*args, **kwargs):
+            raise RuntimeError("worker processes can't use the shared pool")
+
+        monkeypatch.setattr(audalign.pool, "can_use_pool", lambda: False)
+        monkeypatch.setattr(audalign.pool, "get_pool", no_pool)
+        recognizer = ad.CorrelationRecognizer()
+        recognizer.config.sample_rate = 4000
+        result = ad.align_files(test_file_eig, test_file_eig2, recognizer=recognizer)
+        assert result
+
     def test_align_cor_options(self, tmpdir):
         recognizer = ad.CorrelationRecognizer()
         recognizer.config.sample_rate = 4000
@@ -1,8 +1,11 @@
 import os
 import pickle
+import struct
 
 import audalign as ad
+import numpy as np
 import pytest
+from pydub import AudioSegment, effects
 
 try:
     import noisereduce
@@ -96,6 +99,26 @@ class TestFingerprinter:
         ada.load_fingerprinted_files("tests/test_audalign.py")  # Not Loaded
         ada.load_fingerprinted_files("file_not_there.json")
 
+    def test_write_and_load_packed(self, tmpdir):
+        ada = ad.FingerprintRecognizer()
+        ada.config.set_accuracy(1)
+        ada.config.set_hash_engine("numpy")
+        ada.config.set_hash_format("packed")
+        ada.fingerprint_file(self.test_file)
+        total_fingerprints = ada.total_fingerprints
+        assert total_fingerprints > 0
+
+        for extension in ["json", "pickle"]:
+            save_file = str(tmpdir.join(f"test_save_fingerprints.{extension}"))
+            ada.save_fingerprinted_files(save_file)
+            ada.clear_fingerprints()
+            ada.load_fingerprinted_files(save_file)
+            assert ada.total_fingerprints == total_fingerprints
+            assert isinstance(
+                ada.fingerprinted_files[0][1],
+                ad.recognizers.fingerprint.fingerprinter.PackedHashes,
+            )
+
     def test_get_metadata(self):
         metatdata = ad.get_metadata(file_path=self.test_file)
         assert metatdata != {}
@@ -115,6 +138,49 @@ class TestFilehandler:
         array, _ = ad.filehandler.read(self.test_file, sample_rate=None)
         assert len(array) > 0
 
+    def test_read_decode_cache(self, tmpdir):
+        array, _ = ad.filehandler.read(self.test_file)
+        assert ad.filehandler.read(self.test_file)[0] is not array
+
+        ad.decode_cache.configure(max_size=2**28)
+        try:
+            array, _ = ad.filehandler.read(self.test_file)
+            cached_array, _ = ad.filehandler.read(self.test_file)
+            assert cached_array is array
+            assert not cached_array.flags.writeable
+            other_rate, _ = ad.filehandler.read(self.test_file, sample_rate=8000)
+            assert len(other_rate) < len(array)
+
+            ad.decode_cache.configure(max_size=2**28, cache_dir=str(tmpdir))
+            ad.filehandler.read(self.test_file)
+            assert len(tmpdir.listdir()) == 1
+            ad.decode_cache.clear()
+            mapped_array, _ = ad.filehandler.read(self.test_file)
+            assert np.array_equal(mapped_array, array)
+        finally:
+            ad.decode_cache.configure()
+
+    def test_read_native_wav(self, tmpdir):
+        # 24 bit, 3 channel wav, which pydub converts sample by sample
+        frames = np.random.default_rng(0).integers(-(2**23), 2**23, (30000, 3))
+        data = frames.astype("<i4").view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+        fmt = struct.pack("<HHIIHH", 1, 3, 48000, 48000 * 9, 9, 24)
+        chunks = b"fmt " + struct.pack("<I", 16) + fmt
+        chunks += b"data" + struct.pack("<I", len(data)) + data
+        wav_path = str(tmpdir.join("native.wav"))
+        with open(wav_path, "wb") as f:
+            f.write(b"RIFF" + struct.pack("<I", 4 + len(chunks)) + b"WAVE" + chunks)
+
+        audiofile = ad.filehandler.create_audiosegment(wav_path, sample_rate=44100)
+        pydub_audiofile = (
+            AudioSegment.from_file(wav_path)
+            .set_frame_rate(44100)
+            .set_sample_width(2)
+            .set_channels(1)
+        )
+        assert audiofile._data == effects.normalize(pydub_audiofile)._data
+        assert ad.filehandler._read_native(self.test_file, 44100, True) is None
+
     def test_get_aud_dir(self):
         file_list = ad.filehandler.get_audio_files_directory("tests")
         assert len(file_list) == 0
@@ -1,10 +1,32 @@
 from pydub.exceptions import CouldntDecodeError
 import audalign as ad
+import audalign.filehandler as filehandler
+import audalign.pool
 import os
+import pickle
+import sys
+import time
+import numpy as np
 import pytest
+import scipy.signal as signal
 from audalign.config.correlation import CorrelationConfig
+from audalign.recognizers.correcognize.correcognize import (
+    TargetSpectrum,
+    correlate_lags,
+    correlate_overlap_add,
+    _find_peaks_in_chunks,
+    correlate_full,
+    correlate_windows,
+    find_index_arr,
+)
 
 from audalign.config.fingerprint import FingerprintConfig
+from audalign.recognizers.fingerprint import (
+    fingerprint_cache,
+    fingerprint_db,
+    fingerprint_library,
+    recognize,
+)
 
 try:
     import skimage
@@ -60,6 +82,291 @@ class TestFingerprinting:
         fingerprint_recognizer.fingerprint_file(self.test_file)
         assert fingerprint_recognizer.total_fingerprints > 0
 
+    def test_fingerprint_file_numpy_hash_engine(self):
+        fingerprint_recognizer = ad.FingerprintRecognizer()
+        fingerprint_recognizer.config.set_accuracy(1)
+        fingerprint_recognizer.config.set_hash_engine("numpy")
+
+        for hash_style in ["base", "panako", "panako_mod", "base_three"]:
+            fingerprint_recognizer.clear_fingerprints()
+            fingerprint_recognizer.config.set_hash_style(hash_style)
+            fingerprint_recognizer.fingerprint_file(self.test_file)
+            assert fingerprint_recognizer.total_fingerprints > 0
+
+        with pytest.raises(ValueError):
+            fingerprint_recognizer.config.set_hash_engine("bad_hash_engine")
+        assert fingerprint_recognizer.config.get_hash_engine() == "numpy"
+
+    def test_fingerprint_file_square_peak_detection(self):
+        fingerprint_recognizer = ad.FingerprintRecognizer()
+        fingerprint_recognizer.config.set_accuracy(1)
+        fingerprint_recognizer.config.set_peak_detection("square")
+        fingerprint_recognizer.fingerprint_file(self.test_file)
+        assert fingerprint_recognizer.total_fingerprints > 0
+
+        with pytest.raises(ValueError):
+            fingerprint_recognizer.config.set_peak_detection("bad_peak_detection")
+        assert fingerprint_recognizer.config.get_peak_detection() == "square"
+
+    def test_fingerprint_streaming(self):
+        config = FingerprintConfig()
+        config.set_accuracy(1)
+        config.set_hash_engine("numpy")
+        config.streaming_block_size = 1.5
+        channel, _ = ad.filehandler.read(self.test_file, sample_rate=config.sample_rate)
+
+        hashes = ad.recognizers.fingerprint.fingerprinter.fingerprint(channel, config)
+        streamed_hashes = ad.recognizers.fingerprint.fingerprinter.fingerprint_streaming(
+            channel, config
+        )
+        assert len(hashes) > 0
+        assert streamed_hashes == hashes
+
+    def test_fingerprint_spectrogram(self):
+        import matplotlib.mlab as mlab
+
+        config = FingerprintConfig()
+        channel, _ = ad.filehandler.read(self.test_file, sample_rate=config.sample_rate)
+        arr2D = ad.recognizers.fingerprint.fingerprinter.fingerprint(
+            channel, config, retspec=True
+        )
+        mlab_arr2D = mlab.specgram(
+            channel,
+            NFFT=config.fft_window_size,
+            Fs=config.sample_rate,
+            window=mlab.window_hanning,
+            noverlap=int(config.fft_window_size * config.DEFAULT_OVERLAP_RATIO),
+        )[0]
+        mlab_arr2D = 10 * np.log2(mlab_arr2D)
+        assert arr2D.dtype == np.float32
+        assert arr2D.shape == mlab_arr2D.shape
+        loud = arr2D > config.default_amp_min
+        assert np.any(loud)
+        assert np.allclose(arr2D[loud], mlab_arr2D[loud], atol=0.01)
+
+    def test_fingerprint_cache(self, tmp_path, monkeypatch):
+        fingerprint_recognizer = ad.FingerprintRecognizer()
+        fingerprint_recognizer.config.set_accuracy(1)
+        fingerprint_recognizer.config.multiprocessing = False
+        fingerprint_recognizer.config.cache_dir = str(tmp_path)
+        fingerprint_recognizer.fingerprint_directory("test_audio/testers")
+        assert len(os.listdir(tmp_path)) == 2
+        hashes = dict(
+            zip(
+                fingerprint_recognizer.file_names,
+                fingerprint_recognizer.fingerprinted_files,
+            )
+        )
+
+        fingerprint_recognizer.clear_fingerprints()
+        fingerprint_recognizer.fingerprint_directory("test_audio/testers")
+        fingerprint_recognizer.fingerprint_file(test_file_eig)
+        assert len(os.listdir(tmp_path)) == 3
+        for name, fingerprints in zip(
+            fingerprint_recognizer.file_names, fingerprint_recognizer.fingerprinted_files
+        ):
+            if name in hashes:
+                assert fingerprints == hashes[name]
+
+        cache = fingerprint_recognizer._fingerprint_cache()
+        assert cache.get(test_file_eig, fingerprint_recognizer.config) is not None
+        monkeypatch.setattr(fingerprint_cache, "CACHE_VERSION", -1)
+        assert cache.get(test_file_eig, fingerprint_recognizer.config) is None
+        monkeypatch.undo()
+
+        fingerprint_recognizer.config.cache_max_size = 0
+        fingerprint_recognizer.fingerprint_file(test_file_eig2)
+        assert len(os.listdir(tmp_path)) == 0
+
+    def test_fingerprint_directory_order(self):
+        pulled = []
+
+        def items():
+            for seconds in [0.5, 0, 0, 0, 0]:
+                pulled.append(seconds)
+                yield seconds
+
+        results = audalign.pool.imap(time.sleep, items(), processes=2, max_in_flight=2)
+        assert next(results)[0] == 0.5
+        assert len(pulled) == 3
+        assert [seconds for seconds, _ in results] == [0, 0, 0, 0]
+
+        fingerprint_recognizer = ad.FingerprintRecognizer()
+        fingerprint_recognizer.config.set_accuracy(1)
+        fingerprint_recognizer.fingerprint_directory("test_audio/testers")
+        file_names = [
+            os.path.basename(x[0])
+            for x in filehandler.find_files(
+                "test_audio/testers", fingerprint_recognizer.config.extensions
+            )
+        ]
+        assert len(file_names) > 1
+        assert fingerprint_recognizer.file_names == file_names
+
+    def test_fingerprinted_files_views(self):
+        fingerprint_recognizer = ad.FingerprintRecognizer()
+        fingerprinted_files = fingerprint_recognizer.fingerprinted_files
+        file_names = fingerprint_recognizer.file_names
+        fingerprinted_files.append(["a", {"0a1b2c": [1, 2]}])
+        fingerprinted_files.extend([["b", {"0a1b2d": [3]}], ["c", {"0a1b2c": [4]}]])
+        assert fingerprint_recognizer.total_fingerprints == 3
+        assert len(fingerprint_recognizer._hash_index) == 0
+        fingerprint_recognizer.sync_hash_index()
+        assert fingerprint_recognizer._hash_index.names() == ["a", "b", "c"]
+        assert file_names[-1] == "c"
+        assert file_names[1:] == ["b", "c"]
+
+        assert fingerprinted_files.pop(0) == ["a", {"0a1b2c": [1, 2]}]
+        file_names.remove("c")
+        assert file_names == ["b"]
+        assert fingerprint_recognizer.total_fingerprints == 1
+        with pytest.raises(ValueError):
+            file_names.remove("c")
+
+        fingerprinted_files.append(["d", {"0a1b2e": [5, 6]}])
+        file_names[0] = "e"
+        assert fingerprinted_files == [
+            ["e", {"0a1b2d": [3]}],
+            ["d", {"0a1b2e": [5, 6]}],
+        ]
+        fingerprinted_files[1] = ["f", {"0a1b2f": [7]}]
+        assert file_names == ["e", "f"]
+        fingerprint_recognizer.sync_hash_index()
+        assert sorted(fingerprint_recognizer._hash_index.names()) == ["e", "f"]
+        with pytest.raises(ValueError):
+            file_names[0] = "f"
+
+        del fingerprinted_files[:]
+        assert len(file_names) == 0
+        assert fingerprint_recognizer.total_fingerprints == 0
+        with pytest.raises(IndexError):
+            file_names.pop()
+
+    def test_fingerprint_database(self, tmp_path):
+        fingerprint_recognizer = ad.FingerprintRecognizer()
+        fingerprint_recognizer.config.set_accuracy(1)
+        fingerprint_recognizer.config.multiprocessing = False
+        fingerprint_recognizer.fingerprint_file(test_file_eig)
+        fingerprint_recognizer.fingerprint_file(test_file_eig2)
+        results = ad.recognize(test_file_eig, recognizer=fingerprint_recognizer)
+
+        database_file = str(tmp_path / "fingerprints.fpdb")
+        fingerprint_recognizer.save_fingerprinted_files(database_file)
+        loaded_recognizer = ad.FingerprintRecognizer(
+            load_fingerprints_file=database_file
+        )
+        assert loaded_recognizer.file_names == fingerprint_recognizer.file_names
+        assert (
+            loaded_recognizer.total_fingerprints
+            == fingerprint_recognizer.total_fingerprints
+        )
+        assert isinstance(
+            loaded_recognizer.fingerprinted_files[0][1],
+            ad.recognizers.fingerprint.fingerprinter.StoredHashes,
+        )
+        loaded_results = ad.recognize(test_file_eig, recognizer=loaded_recognizer)
+        # stored hashes have no hash dict order, so equal confidences are in hash order
+        for name, match in results["match_info"].items():
+            loaded_match = loaded_results["match_info"][name]
+            assert sorted(zip(match["confidence"], match["offset_frames"])) == sorted(
+                zip(loaded_match["confidence"], loaded_match["offset_frames"])
+            )
+
+        loaded_recognizer.pop_filename(os.path.basename(test_file_eig2))
+        assert ad.recognize(test_file_eig, recognizer=loaded_recognizer) is None
+
+        pickle_file = str(tmp_path / "fingerprints.pickle")
+        fingerprint_recognizer.save_fingerprinted_files(pickle_file)
+        fingerprint_db.convert_fingerprints_file(
+            pickle_file, str(tmp_path / "converted.fpdb")
+        )
+        database = fingerprint_db.FingerprintDatabase(
+            str(tmp_path / "converted.fpdb")
+        )
+        assert database.names() == fingerprint_recognizer.file_names
+        file_ids, t_offsets, a_offsets = database.find_matches(
+            fingerprint_recognizer.fingerprinted_files[0][1]
+        )
+        assert len(file_ids) > 0
+
+    def test_fingerprint_library(self, tmp_path, monkeypatch):
+        library_path = str(tmp_path / "library.fplib")
+        fingerprint_recognizer = ad.FingerprintRecognizer()
+        fingerprint_recognizer.config.set_accuracy(1)
+        fingerprint_recognizer.fingerprint_file(test_file_eig)
+        fingerprint_recognizer.save_fingerprinted_files(library_path)
+
+        fingerprint_recognizer = ad.FingerprintRecognizer(
+            load_fingerprints_file=library_path
+        )
+        fingerprint_recognizer.config.set_accuracy(1)
+        fingerprint_recognizer.fingerprint_file(test_file_eig2)
+        fingerprint_recognizer.save_fingerprinted_files(library_path)
+        library = fingerprint_library.FingerprintLibrary(library_path)
+        assert library.num_segments() == 2
+        assert library.names() == fingerprint_recognizer.file_names
+
+        fingerprint_recognizer = ad.FingerprintRecognizer(
+            load_fingerprints_file=library_path
+        )
+        assert ad.recognize(test_file_eig, recognizer=fingerprint_recognizer)
+        total_fingerprints = fingerprint_recognizer.total_fingerprints
+        fingerprint_recognizer.pop_filename(os.path.basename(test_file_eig))
+        fingerprint_recognizer.save_fingerprinted_files(library_path)
+        library = fingerprint_library.FingerprintLibrary(library_path)
+        assert library.num_segments() == 2
+        assert library.names() == [os.path.basename(test_file_eig2)]
+
+        def remove_in_use(path):
+            raise PermissionError(path)
+
+        with monkeypatch.context() as m:
+            m.setattr(os, "remove", remove_in_use)
+            library.compact()
+        assert library.num_segments() == 1
+        assert len(os.listdir(library_path)) == 4
+        assert fingerprint_library.FingerprintLibrary(library_path).names() == [
+            os.path.basename(test_file_eig2)
+        ]
+        assert len(os.listdir(library_path)) == 2
+        fingerprint_recognizer = ad.FingerprintRecognizer(
+            load_fingerprints_file=library_path
+        )
+        assert fingerprint_recognizer.file_names == [os.path.basename(test_file_eig2)]
+        assert 0 < fingerprint_recognizer.total_fingerprints < total_fingerprints
+
+    def test_recognize_shards(self):
+        fingerprint_recognizer = ad.FingerprintRecognizer()
+        fingerprint_recognizer.config.set_accuracy(1)
+        fingerprint_recognizer.config.multiprocessing = False
+        fingerprint_recognizer.fingerprint_directory("test_audio/testers")
+        fingerprint_recognizer.fingerprint_file(test_file_eig2)
+        results = ad.recognize(test_file_eig, recognizer=fingerprint_recognizer)
+
+        fingerprint_recognizer.config.recognition_shards = 2
+        sharded_results = ad.recognize(test_file_eig, recognizer=fingerprint_recognizer)
+        assert sharded_results["match_info"] == results["match_info"]
+        assert len(fingerprint_recognizer._shards) == len(
+            fingerprint_recognizer.file_names
+        )
+        fingerprint_recognizer.close_recognition_shards()
+
+    def test_fingerprint_directory_shared_pool(self):
+        fingerprint_recognizer = ad.FingerprintRecognizer()
+        fingerprint_recognizer.config.set_accuracy(1)
+        fingerprint_recognizer.config.num_processors = 2
+        fingerprint_recognizer.fingerprint_directory("test_audio/testers")
+        pool = ad.pool.get_pool(2)
+        total_fingerprints = fingerprint_recognizer.total_fingerprints
+        assert total_fingerprints > 0
+
+        fingerprint_recognizer.clear_fingerprints()
+        fingerprint_recognizer.config.max_in_flight = 1
+        fingerprint_recognizer.fingerprint_directory("test_audio/testers")
+        assert ad.pool.get_pool(2) is pool
+        assert fingerprint_recognizer.total_fingerprints == total_fingerprints
+        ad.pool.close_pool()
+
     def test_fingerprint_bad_hash_styles(self):
         fingerprint_recognizer = ad.FingerprintRecognizer()
         try:
@@ -156,6 +463,55 @@ class TestRecognize:
         result = ada2.recognize(test_file_eig2)
         assert result
 
+    def test_recognize_fingerprint_numpy_hash_engine(self):
+        ada2 = ad.FingerprintRecognizer()
+        ada2.config.set_accuracy(1)
+        ada2.config.set_hash_engine("numpy")
+
+        ada2.fingerprint_file(test_file_eig)
+        result = ada2.recognize(test_file_eig2)
+        assert result
+
+    def test_recognize_fingerprint_packed(self):
+        ada2 = ad.FingerprintRecognizer()
+        ada2.config.set_accuracy(1)
+        ada2.config.set_hash_engine("numpy")
+        ada2.config.set_hash_format("packed")
+
+        ada2.fingerprint_file(test_file_eig)
+        result = ada2.recognize(test_file_eig2)
+        assert result
+        assert result["match_info"][os.path.basename(test_file_eig)]
+
+    def test_recognize_fingerprint_after_pop_and_add(self):
+        ada2 = ad.FingerprintRecognizer()
+        ada2.config.set_accuracy(1)
+        ada2.fingerprint_file(test_file_eig)
+        ada2.fingerprint_file(test_file_eig2)
+
+        popped = ada2.pop_filename(os.path.basename(test_file_eig))
+        result = ada2.recognize(test_file_eig2)
+        assert result is None
+
+        ada2.add_filename(*popped)
+        result = ada2.recognize(test_file_eig2)
+        assert result["match_info"][os.path.basename(test_file_eig)]
+
+    def test_recognize_match_order(self):
+        ada2 = ad.FingerprintRecognizer()
+        ada2.fingerprinted_files.append(
+            ["a", {"ffff000000000000": [0], "0000000000000000": [5]}]
+        )
+        ada2.sync_hash_index()
+        file_names, matches = recognize.match_array(
+            ada2._hash_index,
+            *ada2._hash_index.find_matches(
+                {"ffff000000000000": [0], "0000000000000000": [0]}
+            ),
+        )
+        # equal counts keep the order of the target's hash dict
+        assert list(recognize.align_matches(file_names, matches)["a"]) == [0, 5]
+
     def test_recognize_max_lags(self):
         _max_lags = 4
         self.fingerprint_recognizer.config.max_lags = 4
@@ -312,6 +668,31 @@ class TestRecognize:
         )
         assert results
 
+    @pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+    def test_correcognize_directory_shared_target(self):
+        recognizer = ad.CorrelationRecognizer()
+        recognizer.config.multiprocessing = False
+        single_results = ad.recognize(
+            test_file,
+            "test_audio/testers/",
+            recognizer=recognizer,
+        )
+        recognizer.config.multiprocessing = True
+        results = ad.recognize(
+            test_file,
+            "test_audio/testers/",
+            recognizer=recognizer,
+        )
+        assert results["match_info"] == single_results["match_info"]
+
+        target = np.arange(12, dtype=np.int16).reshape(3, 4).T
+        with ad.pool.SharedArray(target) as shared:
+            attached = pickle.loads(pickle.dumps(shared))
+            assert np.array_equal(attached.array, target)
+            attached.close()
+        with pytest.raises(FileNotFoundError):
+            pickle.loads(pickle.dumps(shared))
+
     def test_correcognize_max_lags(self):
         _max_lags = 4
         recognizer = ad.CorrelationRecognizer()
@@ -328,6 +709,171 @@ class TestRecognize:
         assert min(offset_seconds) < _max_lags
         assert max(offset_seconds) < _max_lags
 
+    def test_correcognize_normalize_within_max_lags(self):
+        recognizer = ad.CorrelationRecognizer()
+        # the highest correlation is at 0.015 seconds
+        recognizer.config.max_lags = 0.01
+        results = ad.recognize(test_file_eig, test_file_eig2, recognizer=recognizer)
+        recognizer.config.normalize_within_max_lags = True
+        window_results = ad.recognize(
+            test_file_eig, test_file_eig2, recognizer=recognizer
+        )
+        match = results["match_info"][os.path.basename(test_file_eig2)]
+        window_match = window_results["match_info"][os.path.basename(test_file_eig2)]
+        assert window_match["offset_samples"] == match["offset_samples"]
+        # relative to the highest correlation at any lag or within max_lags
+        ratios = np.array(window_match["confidence"]) / np.array(match["confidence"])
+        assert np.allclose(ratios, ratios[0])
+        assert ratios[0] > 1
+
+    def test_correcognize_lag_window(self):
+        against = np.random.default_rng(0).standard_normal(30000)
+        target = np.roll(against, 1234)[:20000]
+        for min_lag, max_lag in [(-2000, 2000), (-50000, 50000), (100, 300)]:
+            correlation, len_tups, first_lag = correlate_lags(
+                against, target, min_lag, max_lag
+            )
+            full = signal.correlate(against, target)
+            lags = signal.correlation_lags(*len_tups)
+            in_window = (lags >= min_lag) & (lags <= max_lag)
+            assert first_lag == lags[in_window][0]
+            assert np.allclose(correlation, full[in_window])
+
+    def test_correcognize_target_spectrum(self, monkeypatch):
+        rng = np.random.default_rng(0)
+        target = rng.standard_normal(20000)
+        for against_size in [15000, 30000, 200000]:
+            against = rng.standard_normal(against_size)
+            full = signal.correlate(against, target)
+            correlation, _, first_lag = correlate_overlap_add(
+                against, target, TargetSpectrum(target)
+            )
+            assert first_lag is None
+            assert np.allclose(correlation, full)
+
+            correlation, len_tups, first_lag = correlate_lags(
+                against, target, -2000, 2000, TargetSpectrum(target, 2000)
+            )
+            lags = signal.correlation_lags(*len_tups)
+            in_window = (lags >= -2000) & (lags <= 2000)
+            assert np.allclose(correlation, full[in_window])
+
+        recognizer = ad.CorrelationRecognizer()
+        recognizer.config.target_spectrum_max_size = 2**30
+        results = ad.recognize(test_file, "test_audio/testers/", recognizer=recognizer)
+
+        def no_target_spectrum(*args, **kwargs):
+            raise AssertionError("TargetSpectrum built by default")
+
+        monkeypatch.setattr(
+            sys.modules["audalign.recognizers.correcognize.correcognize"],
+            "TargetSpectrum",
+            no_target_spectrum,
+        )
+        no_spectrum_results = ad.recognize(
+            test_file, "test_audio/testers/", recognizer=ad.CorrelationRecognizer()
+        )
+        for name, match in results["match_info"].items():
+            assert (
+                match["offset_seconds"]
+                == no_spectrum_results["match_info"][name]["offset_seconds"]
+            )
+
+    def test_correcognize_locality_windows(self):
+        rng = np.random.default_rng(0)
+        against = rng.standard_normal(50000)
+        target = rng.standard_normal(40000)
+        locality, max_lags = 3000, 2000
+        indexes = find_index_arr(against, target, locality, max_lags, 0.5)
+        assert indexes == [
+            (i, j)
+            for i, j in find_index_arr(against, target, locality, None, 0.5)
+            if abs(j - i) <= max_lags + locality - 1
+        ]
+        for max_spectra_size in [None, 1]:
+            for (correlation, len_tups), pair in correlate_windows(
+                against, target, locality, indexes, max_spectra_size
+            ):
+                assert len_tups == (locality, locality)
+                assert np.allclose(
+                    correlation,
+                    signal.correlate(
+                        against[pair[0] : pair[0] + locality],
+                        target[pair[1] : pair[1] + locality],
+                    ),
+                )
+
+    def test_correcognize_coarse_to_fine(self):
+        recognizer = ad.CorrelationRecognizer()
+        results = ad.recognize(test_file_eig, test_file_eig2, recognizer=recognizer)
+        recognizer.config.coarse_factor = 8
+        coarse_results = ad.recognize(
+            test_file_eig, test_file_eig2, recognizer=recognizer
+        )
+        match = results["match_info"][os.path.basename(test_file_eig2)]
+        coarse_match = coarse_results["match_info"][os.path.basename(test_file_eig2)]
+        assert coarse_match["offset_samples"][:5] == match["offset_samples"][:5]
+        assert np.allclose(coarse_match["confidence"][:5], match["confidence"][:5])
+
+        recognizer.config.max_lags = 4
+        coarse_results = ad.recognize(
+            test_file_eig, test_file_eig2, recognizer=recognizer
+        )
+        offset_seconds = coarse_results["match_info"][
+            os.path.basename(test_file_eig2)
+        ]["offset_seconds"]
+        assert max(abs(x) for x in offset_seconds) <= 4
+
+    def test_correcognize_float32(self):
+        recognizer = ad.CorrelationRecognizer()
+        results = ad.recognize(test_file_eig, test_file_eig2, recognizer=recognizer)
+        recognizer.config.float32 = True
+        float32_results = ad.recognize(
+            test_file_eig, test_file_eig2, recognizer=recognizer
+        )
+        match = results["match_info"][os.path.basename(test_file_eig2)]
+        float32_match = float32_results["match_info"][os.path.basename(test_file_eig2)]
+        assert float32_match["offset_samples"][:5] == match["offset_samples"][:5]
+        assert np.allclose(
+            float32_match["confidence"][:5], match["confidence"][:5], atol=1e-5
+        )
+
+        rng = np.random.default_rng(2)
+        against, target = rng.standard_normal(3000), rng.standard_normal(1000)
+        assert np.allclose(
+            correlate_full(against, target), signal.correlate(against, target)
+        )
+        correlation = np.repeat(rng.integers(0, 4, 2000), rng.integers(1, 6, 2000))
+        correlation = correlation.astype(np.float32)
+        peaks, properties = signal.find_peaks(correlation, height=1)
+        chunk_peaks, chunk_properties = _find_peaks_in_chunks(
+            correlation, height=1, chunk_size=64
+        )
+        assert np.array_equal(chunk_peaks, peaks)
+        assert np.array_equal(chunk_properties["peak_heights"], properties["peak_heights"])
+
+    def test_correcognize_plot(self, monkeypatch):
+        plotted = {}
+
+        def plot_cor(**kwargs):
+            plotted.update(kwargs)
+
+        monkeypatch.setattr(
+            sys.modules["audalign.recognizers.correcognize.correcognize"],
+            "plot_cor",
+            plot_cor,
+        )
+        recognizer = ad.CorrelationRecognizer()
+        recognizer.config.plot = True
+        results = ad.recognize(test_file_eig, test_file_eig2, recognizer=recognizer)
+        assert results
+        # plotted before find_maxes normalized the correlation in place
+        assert np.allclose(
+            plotted["corr_array"][0],
+            correlate_full(plotted["array_b"], plotted["array_a"]),
+        )
+        assert np.max(plotted["corr_array"][0]) > 1
+
     def test_correcognize_locality_max_lags(self):
         _max_lags = 4
         recognizer = ad.CorrelationRecognizer()